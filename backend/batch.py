@@ -0,0 +1,104 @@
+"""Batch create / update-status / delete for the `/<entity>/batch` endpoints.
+
+One request carries many operations and they run in one transaction with a
+fixed number of statements: one SELECT checks which targeted ids the user
+owns, then there is one UPDATE per status value, one DELETE and one
+multi-row INSERT ... RETURNING id for the creates (MySQL has no RETURNING,
+so there it is one INSERT per created row). Each operation gets its own
+result (HTTP-style status code), so a missing id does not fail the rest of
+the batch.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from fastapi import status
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .imports import insert_returning_ids
+from .models import BatchResult
+from .versions import ENTITIES, bump_version
+
+
+async def run_batch(
+    db: AsyncSession,
+    model,
+    user_id: int,
+    operations: list,
+    create_rows: Callable[[list], list[dict]],
+    status_values: Optional[Callable[[bool, datetime], dict]] = None,
+    before_delete: Optional[Callable[[AsyncSession, list[int]], Awaitable[None]]] = None,
+    after_create: Optional[Callable[[AsyncSession, list[int], list], Awaitable[None]]] = None,
+) -> list[BatchResult]:
+    """Apply `operations` for `user_id` and commit.
+
+    `create_rows` builds column values from the create payloads,
+    `status_values` gives the column values for update_status,
+    `before_delete` removes dependent rows (e.g. note tags) for the ids about
+    to be deleted and `after_create` adds them for the created ids.
+    """
+    results: list[Optional[BatchResult]] = [None] * len(operations)
+    now = datetime.now(timezone.utc)
+
+    targeted, seen = [], set()
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            continue
+        if operation.id in seen:
+            results[index] = BatchResult(
+                index=index, op=operation.op, id=operation.id,
+                status=status.HTTP_409_CONFLICT, detail="Id appears more than once in the batch",
+            )
+            continue
+        seen.add(operation.id)
+        targeted.append((index, operation))
+
+    owned = set()
+    if seen:
+        owned = set(await db.scalars(select(model.id).where((model.user_id == user_id) & model.id.in_(seen))))
+
+    to_update, to_delete = defaultdict(list), []
+    for index, operation in targeted:
+        if operation.id not in owned:
+            results[index] = BatchResult(
+                index=index, op=operation.op, id=operation.id, status=status.HTTP_404_NOT_FOUND, detail="Not found"
+            )
+            continue
+        if operation.op == "delete":
+            to_delete.append(operation.id)
+        else:
+            to_update[operation.status].append(operation.id)
+        results[index] = BatchResult(index=index, op=operation.op, id=operation.id, status=status.HTTP_200_OK)
+
+    for value, ids in to_update.items():
+        await db.execute(
+            update(model)
+            .where((model.user_id == user_id) & model.id.in_(ids))
+            .values(**status_values(value, now)),
+            execution_options={"synchronize_session": False},
+        )
+
+    if to_delete:
+        if before_delete is not None:
+            await before_delete(db, to_delete)
+        await db.execute(
+            delete(model).where((model.user_id == user_id) & model.id.in_(to_delete)),
+            execution_options={"synchronize_session": False},
+        )
+
+    creates = [(index, operation) for index, operation in enumerate(operations) if operation.op == "create"]
+    created = []
+    if creates:
+        items = [operation.data for _, operation in creates]
+        created = await insert_returning_ids(db, model.__table__, create_rows(items))
+        if after_create is not None:
+            await after_create(db, created, items)
+        for (index, operation), id in zip(creates, created):
+            results[index] = BatchResult(index=index, op=operation.op, id=id, status=status.HTTP_201_CREATED)
+
+    if to_update or to_delete or creates:
+        updated = [id for ids in to_update.values() for id in ids]
+        await bump_version(db, user_id, ENTITIES[model], created=created, updated=updated, deleted=to_delete)
+    await db.commit()
+    return results
@@ -0,0 +1,84 @@
+"""Change tracking for delta sync.
+
+Every write to a user's todos, diary entries, notes or goals bumps the user's
+version of that entity type (see versions.py) and, in the same transaction,
+stamps a SyncChange row for each written entity with the new version. A
+delete turns the row into a tombstone. `GET /sync` then only has to read the
+rows stamped after the client's cursor.
+
+There is one row per entity however often it changes, so the table grows
+with the number of entities (tombstones included), not with the number of
+writes. Rows stamped by one transaction share its version, and versions of a
+user's entity type are handed out under the row lock of the bump, so they
+become visible in order.
+"""
+from sqlalchemy import exists, false, insert, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import insert_or_update
+from .schemas import Diary, EntityVersion, Goal, Note, SyncChange, Todo
+
+TRACKED = {"todos": Todo, "diaries": Diary, "notes": Note, "goals": Goal}
+
+
+async def record_changes(db: AsyncSession, user_id: int, entity: str, version: int,
+                         created=(), updated=(), deleted=()) -> None:
+    """Stamp the created, updated and deleted ids of `entity` with `version`,
+    with one upsert."""
+    # created_version only applies to new rows. An existing row keeps its
+    # own: SQLite reuses the id of a deleted last row, and to a client that
+    # saw the old row the new one replaces it. Updated or deleted ids without
+    # a row were written before changes were tracked (created_version 0).
+    rows = [
+        {"user_id": user_id, "entity": entity, "entity_id": entity_id,
+         "version": version, "created_version": created_version, "deleted": is_deleted}
+        for ids, is_deleted, created_version in ((created, False, version), (updated, False, 0), (deleted, True, 0))
+        for entity_id in ids
+    ]
+    if rows:
+        await insert_or_update(db, SyncChange.__table__, ["version", "deleted"], rows)
+
+
+async def record_users_updates(db: AsyncSession, entity: str, rows) -> None:
+    """Set-based `record_changes(updated=...)` for the (user_id, entity_id)
+    pairs selected by `rows`, stamped with each user's current version (call
+    after `bump_users_versions`)."""
+    pairs = rows.subquery()
+    user_id, entity_id = pairs.c[0], pairs.c[1]
+    version = (
+        select(EntityVersion.version)
+        .where((EntityVersion.user_id == SyncChange.user_id) & (EntityVersion.entity == entity))
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(SyncChange)
+        .where((SyncChange.entity == entity) & tuple_(SyncChange.user_id, SyncChange.entity_id).in_(select(user_id, entity_id)))
+        .values(version=version, deleted=False)
+        .execution_options(synchronize_session=False)
+    )
+    missing = (
+        select(user_id, literal(entity), entity_id, EntityVersion.version, literal(0), false())
+        .join(EntityVersion, (EntityVersion.user_id == user_id) & (EntityVersion.entity == entity))
+        .where(~exists().where(
+            (SyncChange.user_id == user_id) & (SyncChange.entity == entity) & (SyncChange.entity_id == entity_id)
+        ))
+    )
+    await db.execute(
+        insert(SyncChange).from_select(
+            ["user_id", "entity", "entity_id", "version", "created_version", "deleted"], missing
+        )
+    )
+
+
+def backfill_changes(connection) -> None:
+    """Give entities that predate change tracking a row (version 0), so a
+    full sync finds them. Runs while the table is still empty."""
+    if connection.scalar(select(SyncChange.user_id).limit(1)) is not None:
+        return
+    for entity, model in TRACKED.items():
+        connection.execute(
+            insert(SyncChange).from_select(
+                ["user_id", "entity", "entity_id", "version", "created_version", "deleted"],
+                select(model.user_id, literal(entity), model.id, literal(0), literal(0), false()),
+            )
+        )
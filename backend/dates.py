@@ -0,0 +1,52 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Date, DateTime, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+def start_of_day(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def on_day(column, day: date):
+    """Half-open [day, day + 1) range on a DateTime column. Unlike
+    func.date(column) == day this can use an index on the column."""
+    start = start_of_day(day)
+    return (column >= start) & (column < start + timedelta(days=1))
+
+
+def before_day(column, day: date):
+    return column < start_of_day(day)
+
+
+class at_day(FunctionElement):
+    """`column`'s time of day on `day`, e.g. for moving a timestamp to today
+    in an UPDATE without loading the row."""
+
+    type = DateTime()
+    inherit_cache = True
+
+    def __init__(self, column, day: date):
+        super().__init__(column, literal(day, Date()))
+
+
+@compiles(at_day)
+def _at_day(element, compiler, **kw):
+    # Standard SQL (PostgreSQL): date + time is a timestamp.
+    column, day = list(element.clauses)
+    return f"(CAST({compiler.process(day, **kw)} AS DATE) + CAST({compiler.process(column, **kw)} AS TIME))"
+
+
+@compiles(at_day, "mysql")
+def _at_day_mysql(element, compiler, **kw):
+    column, day = list(element.clauses)
+    return f"TIMESTAMP({compiler.process(day, **kw)}, TIME({compiler.process(column, **kw)}))"
+
+
+@compiles(at_day, "sqlite")
+def _at_day_sqlite(element, compiler, **kw):
+    # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS.ffffff' text; keep the
+    # time part (with microseconds) and swap the date.
+    column, day = list(element.clauses)
+    return f"({compiler.process(day, **kw)} || substr({compiler.process(column, **kw)}, 11))"
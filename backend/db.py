@@ -1,28 +1,261 @@
-from sqlalchemy import create_engine
-import os 
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+import itertools
+import os
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session, sessionmaker
-from typing import Annotated
-from fastapi import Depends
-load_dotenv() 
+from typing import Annotated, Iterator
+import jwt
+from jwt import PyJWTError
+from fastapi import Depends, Request
+from starlette.datastructures import Headers, MutableHeaders
+from .slow_queries import slow_query_log
+load_dotenv()
 
-DB_STRING = os.getenv("DB") 
+DB_STRING = os.getenv("DB")
 
 if not DB_STRING:
     raise RuntimeError("Database connection string 'DB' is not set in environment variables")
 
-engine = create_engine(DB_STRING,pool_pre_ping=True)
-SessionLocal = sessionmaker(
+# Sync drivers in DB are swapped for their asyncio counterparts, so existing
+# connection strings keep working.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(db_string: str) -> URL:
+    url = make_url(db_string)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        # asyncpg spells libpq's sslmode as ssl
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
+
+
+def engine_options(prefix: str) -> dict:
+    """Pool settings from <prefix>_POOL_SIZE, _MAX_OVERFLOW, _POOL_RECYCLE and
+    _POOL_PRE_PING; unset values keep SQLAlchemy's defaults."""
+    options = {"pool_pre_ping": os.getenv(f"{prefix}_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")}
+    for option in ("pool_size", "max_overflow", "pool_recycle"):
+        value = os.getenv(f"{prefix}_{option.upper()}")
+        if value:
+            options[option] = int(value)
+    return options
+
+
+engine = create_async_engine(async_url(DB_STRING), **engine_options("DB"))
+slow_query_log.install(engine)
+SessionLocal = async_sessionmaker(
+    bind=engine,
     autoflush=False,
-    autocommit=False,
-    bind=engine
+    expire_on_commit=False,
 )
-def get_session():
-    db : Session = SessionLocal() 
-    try: 
-        yield db 
-    finally:
-        db.close()
 
-SessionDep = Annotated[Session, Depends(get_session)]
+async def get_session():
+    async with SessionLocal() as db:
+        yield db
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+
+
+# Optional read replicas (comma separated connection strings). Reads made
+# through ReadSessionDep go to one of them; everything else uses the primary.
+# So users see their own writes, a response to a request that may have
+# written carries a signed X-Read-Primary token, and requests sending it back
+# within REPLICA_STICKY_SECONDS read from the primary. The token travels with
+# the client, so it holds whichever worker serves the next request.
+DB_REPLICAS = [url.strip() for url in os.getenv("DB_REPLICAS", "").split(",") if url.strip()]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+READ_PRIMARY_HEADER = "X-Read-Primary"
+READ_PRIMARY_AUDIENCE = "read-primary"
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+# Other methods may write.
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+replica_engines = [create_async_engine(async_url(url), **engine_options("DB_REPLICA")) for url in DB_REPLICAS]
+for replica_engine in replica_engines:
+    slow_query_log.install(replica_engine)
+engines = [engine, *replica_engines]
+
+
+def read_primary_token(user_id: int) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(seconds=REPLICA_STICKY_SECONDS)
+    return jwt.encode({"sub": str(user_id), "aud": READ_PRIMARY_AUDIENCE, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def read_primary_user(token: str | None) -> int | None:
+    """The user id of a valid, unexpired read-primary token, else None."""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], audience=READ_PRIMARY_AUDIENCE)
+        return int(payload["sub"])
+    except (PyJWTError, KeyError, TypeError, ValueError):
+        return None
+
+
+@dataclass
+class ReadPrimary:
+    """The current request's read-primary token user, and whether the request
+    wrote although its method is safe (see record_write)."""
+    user_id: int | None = None
+    wrote: bool = False
+
+
+current_read_primary: ContextVar[ReadPrimary | None] = ContextVar("current_read_primary", default=None)
+
+
+def record_write() -> None:
+    """Mark the current request as having written (for GETs that write), so
+    its response carries a read-primary token."""
+    state = current_read_primary.get()
+    if state is not None:
+        state.wrote = True
+
+
+class ReadPrimaryMiddleware:
+    """ASGI middleware reading the X-Read-Primary token of each request and
+    adding a fresh one to responses to authenticated requests that may have
+    written. Does nothing without replicas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_engines:
+            await self.app(scope, receive, send)
+            return
+        state = ReadPrimary(read_primary_user(Headers(scope=scope).get(READ_PRIMARY_HEADER)))
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start":
+                # Set by get_current_user.
+                user_id = scope.get("state", {}).get("user_id")
+                if user_id is not None and (state.wrote or scope["method"] not in SAFE_METHODS):
+                    MutableHeaders(scope=message).append(READ_PRIMARY_HEADER, read_primary_token(user_id))
+            await send(message)
+
+        reset_token = current_read_primary.set(state)
+        try:
+            await self.app(scope, receive, send_with_token)
+        finally:
+            current_read_primary.reset(reset_token)
+
+
+class ReplicaSession(Session):
+    """Session sending reads to a replica (one per session, round robin from
+    `replicas`) and flushes, DML and reads of requests that wrote or carry
+    a read-primary token for their user to the primary.
+
+    The user is `info["user_id"]`, or the authenticated user of
+    `info["request"]`, looked up when each statement runs."""
+
+    def __init__(self, *args, replicas: Iterator, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = next(replicas)
+
+    def user_id(self):
+        request = self.info.get("request")
+        return self.info.get("user_id") or (getattr(request.state, "user_id", None) if request else None)
+
+    def reads_from_primary(self) -> bool:
+        state = current_read_primary.get()
+        if state is None:
+            return False
+        return state.wrote or (state.user_id is not None and state.user_id == self.user_id())
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase) or self.reads_from_primary():
+            return engine.sync_engine
+        return self.replica
+
+
+def read_sessionmaker(replicas: list) -> async_sessionmaker:
+    """Sessions reading from `replicas` (async engines), see ReplicaSession."""
+    return async_sessionmaker(
+        sync_session_class=ReplicaSession,
+        replicas=itertools.cycle([replica.sync_engine for replica in replicas]),
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+ReadSessionLocal = read_sessionmaker(replica_engines) if replica_engines else SessionLocal
+
+async def get_read_session(request: Request):
+    async with ReadSessionLocal(info={"request": request}) as db:
+        yield db
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
+
+
+def insert_ignoring_conflicts(table):
+    """INSERT that skips rows violating a unique/primary key constraint."""
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect in ("mysql", "mariadb"):
+        return insert(table).prefix_with("IGNORE")
+    return insert(table)
+
+
+async def update_then_insert(db: AsyncSession, table, columns: list[str], rows: list[dict]) -> None:
+    """Portable upsert: UPDATE `columns` of each row by primary key, then one
+    INSERT for the rows that matched nothing. Callers serialize writes to the
+    same keys (see changes.py), so no row appears in between."""
+    keys = [column.key for column in table.primary_key.columns]
+    statement = (
+        update(table)
+        .where(*(table.c[key] == bindparam(f"key_{key}") for key in keys))
+        .values({name: bindparam(f"value_{name}") for name in columns})
+    )
+    missing = []
+    for row in rows:
+        result = await db.execute(
+            statement, {**{f"key_{key}": row[key] for key in keys}, **{f"value_{name}": row[name] for name in columns}}
+        )
+        if not result.rowcount:
+            missing.append(row)
+    if missing:
+        await db.execute(insert(table), missing)
+
 
+async def insert_or_update(db: AsyncSession, table, columns: list[str], rows: list[dict]) -> None:
+    """INSERT `rows`, overwriting `columns` of the existing row when a row
+    with the same primary key is already there."""
+    dialect = engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={name: statement.excluded[name] for name in columns},
+        )
+    elif dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        statement = mysql_insert(table)
+        statement = statement.on_duplicate_key_update({name: statement.inserted[name] for name in columns})
+    else:
+        await update_then_insert(db, table, columns, rows)
+        return
+    await db.execute(statement, rows)
@@ -1,22 +1,119 @@
+import asyncio
+import json
 import os
-import resend
+from abc import ABC, abstractmethod
+import httpx
 from dotenv import load_dotenv
 from pydantic import EmailStr
 
 load_dotenv()
 
-resend.api_key = os.getenv("RESEND_API_KEY")
+RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+RESEND_API_URL = "https://api.resend.com"
+SENDER = "Lumina <onboarding@resend.dev>"
 
-async def send_otp_email(email: EmailStr, otp: str):
-    params = {
-        "from": "Lumina <onboarding@resend.dev>",
+
+class EmailTransport(ABC):
+    """Delivers Resend-style message dicts ({"from", "to", "subject", "html"})."""
+
+    name = "base"
+    batch_size = 1
+
+    @abstractmethod
+    async def send(self, message: dict) -> None:
+        """Deliver one message; raises if the provider rejects it."""
+
+    async def send_batch(self, messages: list[dict]) -> None:
+        for message in messages:
+            await self.send(message)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class ResendTransport(EmailTransport):
+    """Resend REST API over one pooled, keep-alive HTTP client."""
+
+    name = "resend"
+    batch_size = 100  # Resend's limit for /emails/batch
+
+    def __init__(self, api_key: str | None, timeout: float = 10.0):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=RESEND_API_URL,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def send(self, message: dict) -> None:
+        response = await self.client.post("/emails", json=message)
+        response.raise_for_status()
+
+    async def send_batch(self, messages: list[dict]) -> None:
+        if len(messages) == 1:
+            return await self.send(messages[0])
+        response = await self.client.post("/emails/batch", json=messages)
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalSinkTransport(EmailTransport):
+    """Keeps messages in memory and optionally appends them to a JSONL file.
+    `latency` simulates the provider round trip for load tests."""
+
+    name = "local"
+    batch_size = 100
+
+    def __init__(self, path: str | None = None, latency: float = 0.0):
+        self.path = path
+        self.latency = latency
+        self.sent: list[dict] = []
+
+    async def send_batch(self, messages: list[dict]) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.extend(messages)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as sink:
+                sink.writelines(json.dumps(message) + "\n" for message in messages)
+
+    async def send(self, message: dict) -> None:
+        await self.send_batch([message])
+
+
+def get_email_transport() -> EmailTransport:
+    if os.getenv("EMAIL_TRANSPORT", "resend") == "local":
+        return LocalSinkTransport(
+            path=os.getenv("EMAIL_SINK_PATH"),
+            latency=float(os.getenv("EMAIL_SINK_LATENCY_MS", "0")) / 1000,
+        )
+    return ResendTransport(RESEND_API_KEY)
+
+
+email_transport = get_email_transport()
+
+
+def otp_email(email: EmailStr, otp: str) -> dict:
+    return {
+        "from": SENDER,
         "to": [email],
         "subject": "Lumina Verification Code",
         "html": f"<h3>Your verification code is: {otp}</h3><p>Enter this in the app settings to enable notifications.</p>",
     }
-    resend.Emails.send(params)
 
-async def send_reminder_email(email: EmailStr, username: str, task_count: int):
+def reminder_email(email: EmailStr, username: str, task_count: int) -> dict:
     app_link = "https://lumina-app-psi.vercel.app/"
     
     html_content = f"""
@@ -58,10 +155,9 @@ async def send_reminder_email(email: EmailStr, username: str, task_count: int):
     </body>
     """
 
-    params = {
-        "from": "Lumina <onboarding@resend.dev>",
+    return {
+        "from": SENDER,
         "to": [email],
         "subject": "Lumina Daily Task Reminder",
         "html": html_content,
-    }
-    resend.Emails.send(params)
\ No newline at end of file
+    }
\ No newline at end of file
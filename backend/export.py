@@ -0,0 +1,173 @@
+"""Streaming exports of a user's notes and diary entries.
+
+Rows are read with a server-side cursor, `EXPORT_CHUNK_SIZE` at a time, and
+each chunk is encoded and sent before the next one is fetched, so memory use
+does not grow with the number of entries. Formats:
+
+* markdown — one document, entries separated by horizontal rules;
+* ndjson — one JSON object per line, shaped like the API's list responses;
+* zip — one `.md` file per entry. The archive is written without seeking
+  (sizes go in data descriptors); only its central directory, about a
+  hundred bytes per entry, is held until the end.
+"""
+import os
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import AsyncIterator, Callable, Literal
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from .db import ReadSessionLocal
+from .models import ReturnDiary, ReturnNote
+from .schemas import Diary, Note
+from .serialization import build_rows
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+
+ExportFormat = Literal["markdown", "ndjson", "zip"]
+
+MEDIA_TYPES = {
+    "markdown": "text/markdown; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "zip": "application/zip",
+}
+EXTENSIONS = {"markdown": "md", "ndjson": "ndjson", "zip": "zip"}
+
+
+# Zip timestamps cannot predate 1980; also used for entries without one.
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def entry_markdown(title: str, details: list[str], body: str) -> str:
+    # Entries without a timestamp (older rows) have no details line.
+    metadata = f"_{' · '.join(details)}_\n\n" if details else ""
+    return f"# {title}\n\n{metadata}{body}\n"
+
+
+def note_markdown(note: dict) -> str:
+    details = [f"{note['created_at']:%Y-%m-%d %H:%M}"] if note["created_at"] else []
+    if note["tags"]:
+        details.append("tags: " + ", ".join(tag["name"] for tag in note["tags"]))
+    if note["is_pinned"]:
+        details.append("pinned")
+    if note["is_archived"]:
+        details.append("archived")
+    return entry_markdown(note["title"], details, note["content"])
+
+
+def diary_markdown(entry: dict) -> str:
+    timestamp = entry["entry_datetime"]
+    title = entry["title"] or (f"{timestamp:%A, %d %B %Y}" if timestamp else "Untitled")
+    return entry_markdown(title, [f"{timestamp:%Y-%m-%d %H:%M}"] if timestamp else [], entry["content"])
+
+
+@dataclass
+class ExportSpec:
+    name: str
+    model: type
+    response_model: type
+    timestamp_column: object
+    markdown: Callable[[dict], str]
+
+
+NOTES = ExportSpec("notes", Note, ReturnNote, Note.created_at, note_markdown)
+DIARIES = ExportSpec("diaries", Diary, ReturnDiary, Diary.entry_datetime, diary_markdown)
+
+
+async def export_chunks(spec: ExportSpec, user_id: int) -> AsyncIterator[list[dict]]:
+    """The user's entries, oldest first, as response-shaped dicts in chunks."""
+    model = spec.model
+    names = list(spec.response_model.model_fields)
+    columns = [getattr(model, name) for name in names if name in model.__table__.columns]
+    query = (
+        select(*columns)
+        .where(model.user_id == user_id)
+        .order_by(spec.timestamp_column, model.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    # Related rows (note tags) come from a second session: some drivers
+    # cannot run another query while a server-side cursor is open.
+    async with ReadSessionLocal(info={"user_id": user_id}) as db, \
+            ReadSessionLocal(info={"user_id": user_id}) as related_db:
+        result = await db.stream(query)
+        async for chunk in result.partitions():
+            yield await build_rows(related_db, model, spec.response_model, chunk, names)
+
+
+async def markdown_stream(spec: ExportSpec, user_id: int) -> AsyncIterator[bytes]:
+    first = True
+    async for chunk in export_chunks(spec, user_id):
+        parts = []
+        for entry in chunk:
+            if not first:
+                parts.append("\n---\n\n")
+            parts.append(spec.markdown(entry))
+            first = False
+        yield "".join(parts).encode()
+
+
+async def ndjson_stream(spec: ExportSpec, user_id: int) -> AsyncIterator[bytes]:
+    async for chunk in export_chunks(spec, user_id):
+        yield b"".join(orjson.dumps(entry) + b"\n" for entry in chunk)
+
+
+class _ZipSink:
+    """Write-only file object for ZipFile; `drain` hands over what has been
+    written so far. No `seek`, so ZipFile streams."""
+
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def entry_filename(spec: ExportSpec, entry: dict) -> str:
+    title = entry.get("title") or ""
+    slug = re.sub(r"[^\w-]+", "-", title.lower()).strip("-")[:50] or "untitled"
+    timestamp = entry[spec.timestamp_column.key]
+    prefix = f"{timestamp:%Y-%m-%d}-" if timestamp else ""
+    return f"{spec.name}/{prefix}{slug}-{entry['id']}.md"
+
+
+async def zip_stream(spec: ExportSpec, user_id: int) -> AsyncIterator[bytes]:
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for chunk in export_chunks(spec, user_id):
+            for entry in chunk:
+                timestamp: datetime | None = entry[spec.timestamp_column.key]
+                date_time = max(timestamp.timetuple()[:6], ZIP_EPOCH) if timestamp else ZIP_EPOCH
+                info = zipfile.ZipInfo(entry_filename(spec, entry), date_time=date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, spec.markdown(entry))
+            yield sink.drain()
+    yield sink.drain()
+
+
+STREAMS = {"markdown": markdown_stream, "ndjson": ndjson_stream, "zip": zip_stream}
+
+
+def export_response(spec: ExportSpec, user_id: int, format: ExportFormat) -> StreamingResponse:
+    filename = f"{spec.name}-{date.today().isoformat()}.{EXTENSIONS[format]}"
+    return StreamingResponse(
+        STREAMS[format](spec, user_id),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
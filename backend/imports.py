@@ -0,0 +1,352 @@
+"""Streaming bulk import of todos, diary entries, notes and goals.
+
+The upload is parsed one record at a time: NDJSON a line at a time, or a zip
+of Markdown files (as the exports write them) a member at a time. Valid
+records are buffered and written IMPORT_BATCH_SIZE at a time with one
+multi-row INSERT per type (one INSERT per record on MySQL, see
+insert_returning_ids). Note tags for a whole batch are resolved with a
+constant number of queries (see tags.py) and linked with one more INSERT.
+Each batch commits on its own, so a failure only loses that batch.
+
+The response is an NDJSON stream with one line per rejected record, a
+progress line after every batch and a summary line at the end.
+"""
+import os
+import re
+import zipfile
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal, Optional
+
+import orjson
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import SessionLocal
+from .models import ImportDiary, ImportGoal, ImportNote, ImportTodo
+from .schemas import Diary, Goal, Note, Todo
+from .tags import link_note_tags
+from .versions import ENTITIES, bump_version
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Longer NDJSON lines and larger zip members are rejected unread.
+IMPORT_MAX_RECORD_BYTES = int(os.getenv("IMPORT_MAX_RECORD_BYTES", str(1024 * 1024)))
+READ_CHUNK_SIZE = 64 * 1024
+
+ImportFormat = Literal["ndjson", "zip"]
+RecordType = Literal["todo", "diary", "note", "goal"]
+
+RECORD_MODELS = {"todo": ImportTodo, "diary": ImportDiary, "note": ImportNote, "goal": ImportGoal}
+TABLES = {"todo": Todo, "diary": Diary, "note": Note, "goal": Goal}
+# Record types may also be given by their collection name ("notes", or the
+# `notes/` folder of an exported zip).
+ALIASES = {"todos": "todo", "diaries": "diary", "notes": "note", "goals": "goal"}
+
+
+class RecordError(ValueError):
+    pass
+
+
+def record_type(name: Optional[str], default: Optional[str]) -> str:
+    name = ALIASES.get(name, name) if name else default
+    if name is None:
+        raise RecordError('Record has no "type" and no default type was given')
+    if name not in RECORD_MODELS:
+        raise RecordError(f"Unknown record type {name!r}")
+    return name
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'record'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+def todo_row(item: ImportTodo, user_id: int) -> dict:
+    # Same defaults as a todo created through the API.
+    now = datetime.now()
+    entry_datetime = item.entry_datetime
+    if entry_datetime is None:
+        entry_datetime = datetime.combine(item.date, now.time()) if item.date else now
+    return {
+        "title": item.title,
+        "description": item.description,
+        "priority": item.priority,
+        "status": item.status,
+        "edited": False,
+        "entry_datetime": entry_datetime,
+        "completed_datetime": (item.completed_datetime or now) if item.status else None,
+        "user_id": user_id,
+    }
+
+
+def diary_row(item: ImportDiary, user_id: int) -> dict:
+    return {
+        "title": item.title,
+        "content": item.content,
+        "entry_datetime": item.entry_datetime or datetime.now(timezone.utc),
+        "user_id": user_id,
+    }
+
+
+def note_row(item: ImportNote, user_id: int) -> dict:
+    return {
+        "title": item.title,
+        "content": item.content,
+        "is_pinned": item.is_pinned,
+        "is_archived": item.is_archived,
+        "created_at": item.created_at or datetime.now(timezone.utc),
+        "user_id": user_id,
+    }
+
+
+def goal_row(item: ImportGoal, user_id: int) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "title": item.title,
+        "description": item.description,
+        "target_date": item.target_date,
+        "is_completed": item.is_completed,
+        "created_at": item.created_at or now,
+        "completed_at": (item.completed_at or now) if item.is_completed else None,
+        "user_id": user_id,
+    }
+
+
+ROW_BUILDERS = {"todo": todo_row, "diary": diary_row, "note": note_row, "goal": goal_row}
+
+
+def note_tag_names(item: ImportNote) -> list[str]:
+    return [tag if isinstance(tag, str) else tag.name for tag in item.tags]
+
+
+async def insert_returning_ids(db: AsyncSession, table, rows: list[dict]) -> list[int]:
+    """Insert `rows` and return their ids in the same order (needed to link
+    note tags; change tracking only needs the set, but for every type)."""
+    dialect = (await db.connection()).dialect
+    if dialect.name == "sqlite":
+        # SQLite numbers the rows of a multi-row INSERT in order but does not
+        # promise to return them in order, and asking SQLAlchemy to sort them
+        # makes it insert one row at a time.
+        return sorted(await db.scalars(insert(table).returning(table.c.id), rows))
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(await db.scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows))
+    # MySQL has no RETURNING, and with interleaved auto-increment locking
+    # (the default) a multi-row INSERT's ids need not be consecutive, so
+    # LAST_INSERT_ID() cannot give them all: one round trip per row.
+    return [(await db.execute(insert(table), row)).inserted_primary_key[0] for row in rows]
+
+
+async def insert_records(db: AsyncSession, type_name: str, items: list, user_id: int) -> list[int]:
+    """Insert `items` of one type with batched multi-row INSERTs; returns their ids."""
+    table = TABLES[type_name].__table__
+    rows = [ROW_BUILDERS[type_name](item, user_id) for item in items]
+    ids = await insert_returning_ids(db, table, rows)
+    if type_name == "note":
+        await link_note_tags(db, ids, [note_tag_names(item) for item in items])
+    return ids
+
+
+async def ndjson_records(upload: UploadFile) -> AsyncIterator[tuple[dict, dict | RecordError]]:
+    """(location, record) for each non-blank line, reading the upload in chunks.
+    A line over IMPORT_MAX_RECORD_BYTES is rejected and skipped without
+    being held in memory."""
+    too_long = RecordError(f"Line longer than {IMPORT_MAX_RECORD_BYTES} bytes")
+    number, buffer, skipping = 0, b"", False
+    while True:
+        chunk = await upload.read(READ_CHUNK_SIZE)
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop() if chunk else b""
+        for line in lines:
+            if skipping:
+                # The end of a line already rejected as too long.
+                skipping = False
+                continue
+            number += 1
+            if len(line) > IMPORT_MAX_RECORD_BYTES:
+                yield {"line": number}, too_long
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield {"line": number}, RecordError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield {"line": number}, RecordError("Expected a JSON object")
+                continue
+            yield {"line": number}, record
+        if len(buffer) > IMPORT_MAX_RECORD_BYTES:
+            if not skipping:
+                number += 1
+                yield {"line": number}, too_long
+            buffer, skipping = b"", True
+        if not chunk:
+            return
+
+
+METADATA_LINE = re.compile(r"^_(.+)_$")
+
+
+def is_flag_detail(detail: str) -> bool:
+    return detail.startswith("tags: ") or detail in ("pinned", "archived")
+
+
+def parse_markdown(text: str, default_title: str) -> dict:
+    """Record fields from a Markdown entry: `# title`, an optional italic
+    `_YYYY-MM-DD HH:MM · tags: a, b · pinned_` line (without the timestamp
+    for entries that have none), then the body."""
+    lines = text.replace("\r\n", "\n").split("\n")
+    record = {"title": default_title}
+    if lines and lines[0].startswith("# "):
+        record["title"] = lines.pop(0)[2:].strip()
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    match = METADATA_LINE.match(lines[0].strip()) if lines else None
+    if match:
+        details = match.group(1).split(" · ")
+        try:
+            timestamp = datetime.strptime(details[0], "%Y-%m-%d %H:%M")
+            details = details[1:]
+        except ValueError:
+            timestamp = None
+        if timestamp is not None or all(is_flag_detail(detail) for detail in details):
+            lines.pop(0)
+            if timestamp is not None:
+                record["created_at"] = record["entry_datetime"] = timestamp
+            for detail in details:
+                if detail.startswith("tags: "):
+                    record["tags"] = detail[len("tags: "):].split(", ")
+                elif detail == "pinned":
+                    record["is_pinned"] = True
+                elif detail == "archived":
+                    record["is_archived"] = True
+    body = "\n".join(lines).strip("\n")
+    # Todos and goals keep the body as their description.
+    record["content"] = record["description"] = body
+    return record
+
+
+def read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    # ZipFile stops decompressing at the declared file_size (and fails the
+    # CRC check if the data goes on), so the size check below bounds memory.
+    return archive.read(info).decode("utf-8-sig")
+
+
+async def zip_records(upload: UploadFile) -> AsyncIterator[tuple[dict, dict | RecordError]]:
+    """(location, record) for each Markdown file in the uploaded zip. The
+    record type comes from the top-level folder (`notes/`, `diaries/`, ...).
+
+    Reading and inflating the (spooled) upload is blocking file I/O and CPU
+    work, so it runs in the threadpool."""
+    try:
+        archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+    except zipfile.BadZipFile:
+        yield {"file": upload.filename}, RecordError("Not a zip archive")
+        return
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            location = {"file": info.filename}
+            folder, _, name = info.filename.rpartition("/")
+            if not name.lower().endswith(".md"):
+                yield location, RecordError("Not a Markdown (.md) file")
+                continue
+            if info.file_size > IMPORT_MAX_RECORD_BYTES:
+                yield location, RecordError(f"File larger than {IMPORT_MAX_RECORD_BYTES} bytes")
+                continue
+            try:
+                text = await run_in_threadpool(read_member, archive, info)
+            except (UnicodeDecodeError, zipfile.BadZipFile) as e:
+                yield location, RecordError(f"Unreadable file: {e}")
+                continue
+            record = parse_markdown(text, name[:-3])
+            if folder:
+                record["type"] = folder.split("/")[0]
+            yield location, record
+
+
+RECORD_SOURCES = {"ndjson": ndjson_records, "zip": zip_records}
+
+
+class Importer:
+    """Buffers validated records for one user and writes them in batches."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.pending: dict[str, list] = {name: [] for name in RECORD_MODELS}
+        self.pending_locations: list[dict] = []
+        self.records = 0
+        self.errors = 0
+        self.imported = {ENTITIES[model]: 0 for model in TABLES.values()}
+
+    def error(self, location: dict, detail: str) -> bytes:
+        self.errors += 1
+        return orjson.dumps({**location, "error": detail}) + b"\n"
+
+    def progress(self) -> bytes:
+        return orjson.dumps({"progress": {"records": self.records, "imported": sum(self.imported.values()), "errors": self.errors}}) + b"\n"
+
+    def summary(self) -> bytes:
+        return orjson.dumps({"done": True, "records": self.records, "imported": self.imported, "errors": self.errors}) + b"\n"
+
+    def add(self, location: dict, record: dict | RecordError, default_type: Optional[str]) -> Optional[bytes]:
+        """Validate and buffer one record; returns an error line if it is rejected."""
+        self.records += 1
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            type_name = record_type(record.get("type"), default_type)
+            item = RECORD_MODELS[type_name].model_validate(record)
+        except RecordError as e:
+            return self.error(location, str(e))
+        except ValidationError as e:
+            return self.error(location, validation_message(e))
+        self.pending[type_name].append(item)
+        self.pending_locations.append(location)
+        return None
+
+    async def flush(self, db: AsyncSession) -> AsyncIterator[bytes]:
+        if not self.pending_locations:
+            return
+        written = {}
+        try:
+            for type_name, items in self.pending.items():
+                if items:
+                    written[ENTITIES[TABLES[type_name]]] = await insert_records(db, type_name, items, self.user_id)
+            for entity, ids in written.items():
+                await bump_version(db, self.user_id, entity, created=ids)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            # The driver's message, not SQLAlchemy's (which repeats the statement and every row).
+            detail = f"Batch failed: {getattr(e, 'orig', None) or e}"
+            for location in self.pending_locations:
+                yield self.error(location, detail)
+        else:
+            for entity, ids in written.items():
+                self.imported[entity] += len(ids)
+        self.pending = {name: [] for name in RECORD_MODELS}
+        self.pending_locations = []
+        yield self.progress()
+
+
+async def import_stream(upload: UploadFile, format: ImportFormat, user_id: int,
+                        default_type: Optional[str] = None) -> AsyncIterator[bytes]:
+    importer = Importer(user_id)
+    async with SessionLocal() as db:
+        async for location, record in RECORD_SOURCES[format](upload):
+            error = importer.add(location, record, default_type)
+            if error is not None:
+                yield error
+            if len(importer.pending_locations) >= IMPORT_BATCH_SIZE:
+                async for line in importer.flush(db):
+                    yield line
+        async for line in importer.flush(db):
+            yield line
+    yield importer.summary()
@@ -0,0 +1,137 @@
+"""Per-route request metrics and SQL statement accounting.
+
+`RequestMetricsMiddleware` times every HTTP request and labels it with the
+route template (`/todos/{id}`, not the raw path), method and status code.
+Engine event hooks count the statements each request runs and the time
+spent in them, so an N+1 pattern shows up as a route whose statements per
+request grow with the data. Statements outside a request (scheduler jobs,
+the outbox worker) only feed the global counters.
+"""
+import os
+import secrets
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .metrics import Counter, Gauge, Histogram
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+
+# Bearer token for the operator endpoints (/metrics); unset, they are not served.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+http_requests = Counter("lumina_http_requests_total", "HTTP requests by route, method and status code")
+http_latency = Histogram("lumina_http_request_duration_seconds", "HTTP request latency by route")
+http_in_flight = Gauge("lumina_http_requests_in_flight", "HTTP requests being served")
+request_statements = Histogram(
+    "lumina_db_statements_per_request", "SQL statements executed per HTTP request", buckets=QUERY_BUCKETS
+)
+request_db_time = Histogram("lumina_db_seconds_per_request", "Time spent in SQL statements per HTTP request")
+db_statements = Counter("lumina_db_statements_total", "SQL statements executed")
+db_time = Counter("lumina_db_seconds_total", "Time spent in SQL statements")
+
+
+@dataclass
+class RequestStats:
+    scope: dict | None = None
+    statements: int = 0
+    db_seconds: float = 0.0
+
+    @property
+    def route(self) -> str:
+        return f"{self.scope['method']} {route_label(self.scope)}" if self.scope else "background"
+
+
+# Tasks started by a handler copy the context, so they add to the same stats.
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    db_statements.inc()
+    db_time.inc(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute.
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners cannot blow up cardinality.
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording latency, status, in-flight requests and SQL
+    statements / DB time for each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            current_request.reset(token)
+            route, method = route_label(scope), scope["method"]
+            http_requests.inc(route=route, method=method, status=str(status_code))
+            http_latency.observe(elapsed, route=route, method=method)
+            request_statements.observe(stats.statements, route=route, method=method)
+            request_db_time.observe(stats.db_seconds, route=route, method=method)
+
+
+def require_metrics_token(request: Request) -> None:
+    """Dependency for the operator endpoints: 404 while METRICS_TOKEN is unset,
+    401 unless the request sends `Authorization: Bearer <METRICS_TOKEN>`."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
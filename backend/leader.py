@@ -0,0 +1,192 @@
+"""Single-leader election for the background scheduler.
+
+Every worker process starts the APScheduler instance paused and competes for
+one lock; only the holder resumes it, so cron jobs such as the daily
+reminders run once however many API workers there are. The lock is
+
+* a session-level advisory lock on Postgres (`pg_try_advisory_lock`) or a
+  named lock on MySQL (`GET_LOCK`), held on a dedicated connection. The
+  database releases it when that connection or its process dies;
+* an exclusive lock on a file next to the database for SQLite, which only
+  coordinates processes on one host. The OS releases it with the process.
+
+Followers retry every SCHEDULER_LEADER_CHECK_SECONDS and the leader checks
+its connection just as often, so a dead leader is replaced within about one
+interval. A job whose run time falls inside that gap is skipped rather than
+run twice.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .metrics import Gauge
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SCHEDULER_LEADER_CHECK_SECONDS = float(os.getenv("SCHEDULER_LEADER_CHECK_SECONDS", "15"))
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE")
+LOCK_NAME = "lumina-scheduler"
+
+is_leader = Gauge("lumina_scheduler_leader", "1 when this process runs the scheduled jobs")
+
+
+class AdvisoryLock:
+    """Database lock held on a dedicated AUTOCOMMIT connection."""
+
+    ACQUIRE = {
+        "postgresql": "SELECT pg_try_advisory_lock(:key)",
+        "mysql": "SELECT GET_LOCK(:name, 0)",
+    }
+    RELEASE = {
+        "postgresql": "SELECT pg_advisory_unlock(:key)",
+        "mysql": "SELECT RELEASE_LOCK(:name)",
+    }
+
+    def __init__(self, engine: AsyncEngine, name: str):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        database = engine.url.database or ""
+        # MySQL lock names are server-wide (and at most 64 characters).
+        self.params = {
+            "name": f"{name}:{database}"[:64],
+            "key": int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True),
+        }
+        self.connection = None
+
+    async def acquire(self) -> bool:
+        connection = await self.engine.connect()
+        try:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = await connection.scalar(text(self.ACQUIRE[self.dialect]), self.params)
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self.connection = connection
+        return True
+
+    async def held(self) -> bool:
+        try:
+            await self.connection.scalar(text("SELECT 1"))
+            return True
+        except Exception:
+            await self.release()
+            return False
+
+    async def release(self) -> None:
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return
+        try:
+            await connection.execute(text(self.RELEASE[self.dialect]), self.params)
+            await connection.close()
+        except Exception:
+            # A broken connection has lost the lock already; drop it.
+            await connection.invalidate()
+
+
+class FileLock:
+    """Exclusive, non-blocking lock on `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    async def acquire(self) -> bool:
+        file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+        self.file = file
+        return True
+
+    async def held(self) -> bool:
+        return True
+
+    async def release(self) -> None:
+        file, self.file = self.file, None
+        if file is not None:
+            # Closing the file drops the lock.
+            file.close()
+
+
+def leader_lock(engine: AsyncEngine):
+    """The lock to elect the scheduler leader with for `engine`'s database."""
+    if engine.dialect.name in AdvisoryLock.ACQUIRE:
+        return AdvisoryLock(engine, LOCK_NAME)
+    database = engine.url.database
+    if SCHEDULER_LOCK_FILE:
+        path = SCHEDULER_LOCK_FILE
+    elif database and database != ":memory:":
+        path = f"{database}.scheduler.lock"
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"{LOCK_NAME}.lock")
+    return FileLock(path)
+
+
+class SchedulerLeader:
+    """Runs `scheduler`'s jobs only while this process holds `lock`."""
+
+    def __init__(self, scheduler, lock, interval: float = SCHEDULER_LEADER_CHECK_SECONDS):
+        self.scheduler = scheduler
+        self.lock = lock
+        self.interval = interval
+        self.leader = False
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self.scheduler.start(paused=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leader:
+            self.leader = False
+            is_leader.set(0)
+            await self.lock.release()
+        self.scheduler.shutdown()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._elect()
+            except Exception as e:
+                print(f"❌ Scheduler leader election error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _elect(self) -> None:
+        if self.leader:
+            if not await self.lock.held():
+                print("⚠️ Lost the scheduler lock; pausing scheduled jobs")
+                self._step_down()
+        elif await self.lock.acquire():
+            self.leader = True
+            is_leader.set(1)
+            self.scheduler.resume()
+            print(f"👑 This process (pid {os.getpid()}) now runs the scheduled jobs")
+
+    def _step_down(self) -> None:
+        self.leader = False
+        is_leader.set(0)
+        self.scheduler.pause()
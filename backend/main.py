@@ -1,10 +1,20 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from .db import engine
+from .db import READ_PRIMARY_HEADER, ReadPrimaryMiddleware, engine, engines
 from .schemas import Base 
-from .routers import users,diary,auth,todos,notes,goals
-from .scheduler import scheduler
+from .routers import users,diary,auth,todos,notes,goals,dashboard,search,imports,sync
+from .scheduler import scheduler_leader
+from .email_utils import email_transport
+from .outbox import outbox_worker
+from .passwords import password_hasher
+from .pagination import NEXT_CURSOR_HEADER
+from .search import install_search_indexes
+from .migrations import run_migrations
+from .instrumentation import RequestMetricsMiddleware, instrument_engine, require_metrics_token
+from .slow_queries import SLOW_QUERY_TOP, slow_query_log
+from . import metrics
  
 
 # origins = [
@@ -18,15 +28,26 @@ origins = [
     "https://lumina-app-psi.vercel.app",
 ]
 
-def create_db_and_tables():
-    Base.metadata.create_all(engine)
+async def create_db_and_tables():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    await run_migrations()
+    await install_search_indexes()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
-    scheduler.start()
+    await create_db_and_tables()
+    await password_hasher.calibrate()
+    await scheduler_leader.start()
+    outbox_worker.start()
     yield
-    scheduler.shutdown()
+    await scheduler_leader.stop()
+    await slow_query_log.aclose()
+    slow_query_log.print_report()
+    await outbox_worker.stop()
+    await email_transport.aclose()
+    for db_engine in engines:
+        await db_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -38,7 +59,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", READ_PRIMARY_HEADER],
 )
+app.add_middleware(ReadPrimaryMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+for db_engine in engines:
+    instrument_engine(db_engine)
 
 app.include_router(users.router)
 app.include_router(diary.router)
@@ -46,12 +72,27 @@ app.include_router(auth.router)
 app.include_router(todos.router)
 app.include_router(notes.router)
 app.include_router(goals.router)
+app.include_router(dashboard.router)
+app.include_router(search.router)
+app.include_router(imports.router)
+app.include_router(sync.router)
 
 @app.get('/')
 async def greet():
     return "Hello"
 
 
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False,
+         dependencies=[Depends(require_metrics_token)])
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get('/metrics/slow-queries', include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def slow_queries(top: int = SLOW_QUERY_TOP):
+    return slow_query_log.report(top)
+
+
 
 
 
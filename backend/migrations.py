@@ -0,0 +1,110 @@
+"""Brings an existing database up to the current schema.
+
+`Base.metadata.create_all` only creates missing tables, so columns and
+indexes added to tables that already exist are created here, along with
+other changes to existing tables. Every step is idempotent; run it on startup or by hand with
+`python -m backend.migrations`.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, inspect, insert, literal, select, update
+
+from .changes import backfill_changes
+from .db import engine
+from .schemas import Base, Goal, Note, note_tags
+
+
+def add_missing_columns(connection) -> None:
+    """Add new nullable columns to existing tables."""
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+            )
+
+
+def create_missing_indexes(connection) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def add_note_tags_primary_key(connection) -> None:
+    """note_tags used to have no key: drop duplicate/NULL links, then add the
+    (tag_id, note_id) primary key. SQLite cannot add a primary key to an
+    existing table, so it gets an equivalent unique index instead."""
+    inspector = inspect(connection)
+    if inspector.get_pk_constraint("note_tags").get("constrained_columns"):
+        return
+    if any(index["name"] == "ux_note_tags_tag_note" for index in inspector.get_indexes("note_tags")):
+        return
+    tag_id, note_id = note_tags.c.tag_id, note_tags.c.note_id
+    connection.execute(delete(note_tags).where(tag_id.is_(None) | note_id.is_(None)))
+    duplicates = connection.execute(
+        select(tag_id, note_id).group_by(tag_id, note_id).having(func.count() > 1)
+    ).all()
+    for tag, note in duplicates:
+        connection.execute(delete(note_tags).where((tag_id == tag) & (note_id == note)))
+        connection.execute(insert(note_tags).values(tag_id=tag, note_id=note))
+
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("CREATE UNIQUE INDEX ux_note_tags_tag_note ON note_tags (tag_id, note_id)")
+    else:
+        connection.exec_driver_sql("ALTER TABLE note_tags ADD CONSTRAINT pk_note_tags PRIMARY KEY (tag_id, note_id)")
+
+
+# Columns that became NOT NULL, with the columns a missing value is filled
+# from (falling back to the time of the migration).
+REQUIRED_COLUMNS = [
+    (Note.__table__.c.created_at, [Note.__table__.c.edited_at]),
+    (Goal.__table__.c.created_at, [Goal.__table__.c.updated_at, Goal.__table__.c.completed_at]),
+]
+
+
+def require_columns(connection) -> None:
+    """Fill NULLs in REQUIRED_COLUMNS and make them NOT NULL. Keyset
+    pagination and the exports order by these columns, so a NULL would be
+    unreachable. SQLite cannot alter a column; there only the NULLs are
+    filled (new SQLite databases get the constraint from create_all)."""
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    now = literal(datetime.now(timezone.utc), Note.__table__.c.created_at.type)
+    for column, fallbacks in REQUIRED_COLUMNS:
+        table = column.table
+        existing = {info["name"]: info for info in inspector.get_columns(table.name)}
+        if not existing[column.name]["nullable"]:
+            continue
+        connection.execute(
+            update(table).where(column.is_(None)).values({column.name: func.coalesce(*fallbacks, now)})
+        )
+        if connection.dialect.name == "sqlite":
+            continue
+        name = preparer.format_table(table)
+        if connection.dialect.name in ("mysql", "mariadb"):
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE {name} MODIFY {preparer.format_column(column)} {column_type} NOT NULL")
+        else:
+            connection.exec_driver_sql(f"ALTER TABLE {name} ALTER COLUMN {preparer.format_column(column)} SET NOT NULL")
+
+
+async def run_migrations() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(add_missing_columns)
+        await connection.run_sync(add_note_tags_primary_key)
+        await connection.run_sync(require_columns)
+        await connection.run_sync(create_missing_indexes)
+        await connection.run_sync(backfill_changes)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migrations())
+    print("✅ Database schema is up to date.")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Literal, Optional, List, Union
 from datetime import datetime 
 from datetime import date as datetimedate
  
@@ -61,6 +61,9 @@ class ReturnTag(TagBase):
     id : int 
     model_config = ConfigDict(from_attributes=True)
 
+class TagCount(ReturnTag):
+    count : int
+
  
 
 class CreateUser(BaseModel):
@@ -162,3 +165,118 @@ class ReturnGoal(BaseModel):
 
 
 
+class DashboardSummary(BaseModel):
+    pending_todos : int 
+    diary_entries_today : int 
+    notes : int 
+    active_goals : int 
+    streak : int 
+
+class SearchHit(BaseModel):
+    type : str 
+    id : int 
+    title : Optional[str] = None
+    snippet : str 
+    score : float 
+    timestamp : Optional[datetime] = None
+
+
+MAX_BATCH_OPERATIONS = 500
+
+class BatchDelete(BaseModel):
+    op : Literal["delete"]
+    id : int 
+
+class BatchUpdateStatus(BaseModel):
+    op : Literal["update_status"]
+    id : int 
+    status : bool 
+
+class TodoBatchCreate(BaseModel):
+    op : Literal["create"]
+    data : AddTodo
+
+class DiaryBatchCreate(BaseModel):
+    op : Literal["create"]
+    data : CreateDiary
+
+class NoteBatchCreate(BaseModel):
+    op : Literal["create"]
+    data : CreateNote
+
+class GoalBatchCreate(BaseModel):
+    op : Literal["create"]
+    data : CreateGoal
+
+class TodoBatch(BaseModel):
+    operations : List[Annotated[Union[TodoBatchCreate, BatchUpdateStatus, BatchDelete], Field(discriminator="op")]] = Field(max_length=MAX_BATCH_OPERATIONS)
+
+class DiaryBatch(BaseModel):
+    operations : List[Annotated[Union[DiaryBatchCreate, BatchDelete], Field(discriminator="op")]] = Field(max_length=MAX_BATCH_OPERATIONS)
+
+# update_status archives (true) or unarchives (false) a note.
+class NoteBatch(BaseModel):
+    operations : List[Annotated[Union[NoteBatchCreate, BatchUpdateStatus, BatchDelete], Field(discriminator="op")]] = Field(max_length=MAX_BATCH_OPERATIONS)
+
+# update_status completes (true) or reopens (false) a goal.
+class GoalBatch(BaseModel):
+    operations : List[Annotated[Union[GoalBatchCreate, BatchUpdateStatus, BatchDelete], Field(discriminator="op")]] = Field(max_length=MAX_BATCH_OPERATIONS)
+
+class BatchResult(BaseModel):
+    index : int 
+    op : str 
+    id : Optional[int] = None
+    status : int 
+    detail : Optional[str] = None
+
+
+# Bulk import records: the create fields plus the history an export (or
+# another tool) carries. Unknown keys such as `id` are ignored.
+class ImportTodo(AddTodo):
+    status : bool = False
+    entry_datetime : Optional[datetime] = None
+    completed_datetime : Optional[datetime] = None
+
+class ImportDiary(CreateDiary):
+    entry_datetime : Optional[datetime] = None
+
+class ImportNote(CreateNote):
+    created_at : Optional[datetime] = None
+    # Plain names, or tag objects as the note responses have them.
+    tags : List[Union[str, TagBase]] = []
+
+class ImportGoal(CreateGoal):
+    is_completed : bool = False
+    created_at : Optional[datetime] = None
+    completed_at : Optional[datetime] = None
+
+
+# Delta sync: per entity type, the rows created and updated since the cursor
+# (current state) and the ids deleted since it.
+class TodoChanges(BaseModel):
+    created : List[ReturnTodo] = []
+    updated : List[ReturnTodo] = []
+    deleted : List[int] = []
+
+class DiaryChanges(BaseModel):
+    created : List[ReturnDiary] = []
+    updated : List[ReturnDiary] = []
+    deleted : List[int] = []
+
+class NoteChanges(BaseModel):
+    created : List[ReturnNote] = []
+    updated : List[ReturnNote] = []
+    deleted : List[int] = []
+
+class GoalChanges(BaseModel):
+    created : List[ReturnGoal] = []
+    updated : List[ReturnGoal] = []
+    deleted : List[int] = []
+
+class SyncResponse(BaseModel):
+    cursor : str 
+    has_more : bool 
+    todos : TodoChanges
+    diaries : DiaryChanges
+    notes : NoteChanges
+    goals : GoalChanges
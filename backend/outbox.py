@@ -0,0 +1,259 @@
+"""Durable email outbox.
+
+Request handlers and jobs `enqueue` messages as EmailOutbox rows inside their
+own transaction and return. `outbox_worker` drains due rows in batches:
+claims them with a short lease (so several processes can run a worker),
+sends them through the configured transport under a per-provider rate limit,
+retries failures with exponential backoff and dead-letters rows that keep
+failing.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import SessionLocal
+from .email_utils import EmailTransport, email_transport
+from .metrics import Counter, Gauge, Histogram
+from .schemas import EmailOutbox
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_LEASE_SECONDS = 120
+
+# API requests per second allowed per provider (a batch call is one request);
+# 0 means no limit.
+PROVIDER_RATE_LIMITS = {
+    "resend": float(os.getenv("RESEND_RATE_LIMIT", "2")),
+}
+
+queue_depth = Gauge("lumina_email_outbox_depth", "Emails waiting in the outbox")
+emails_delivered = Counter("lumina_email_delivered_total", "Emails delivered")
+email_failures = Counter("lumina_email_failures_total", "Failed email delivery attempts")
+emails_dead_lettered = Counter("lumina_email_dead_lettered_total", "Emails given up on after max attempts")
+delivery_latency = Histogram(
+    "lumina_email_delivery_latency_seconds",
+    "Time from enqueue to delivery",
+    buckets=(1, 5, 15, 30, 60, 300, 900, 3600),
+)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def enqueue(db: AsyncSession, messages: list[dict], kind: str, provider: str | None = None) -> None:
+    """Add messages to the outbox; they are sent once the caller commits."""
+    if not messages:
+        return
+    now = utcnow()
+    await db.execute(
+        insert(EmailOutbox),
+        [
+            {
+                "kind": kind,
+                "provider": provider or email_transport.name,
+                "recipient": ", ".join(message["to"]),
+                "message": json.dumps(message),
+                "status": "pending",
+                "attempts": 0,
+                "created_at": now,
+                "next_attempt_at": now,
+            }
+            for message in messages
+        ],
+    )
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second."""
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        transports: dict[str, EmailTransport] | None = None,
+        session_factory=SessionLocal,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_seconds: float = OUTBOX_POLL_SECONDS,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        retry_base_seconds: float = OUTBOX_RETRY_BASE_SECONDS,
+        rate_limits: dict[str, float] = PROVIDER_RATE_LIMITS,
+    ):
+        self.transports = transports or {email_transport.name: email_transport}
+        self.default_transport = next(iter(self.transports.values()))
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.limiters = {name: RateLimiter(rate) for name, rate in rate_limits.items() if rate > 0}
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        """Wake the worker now instead of at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self) -> None:
+        # Created here so the event belongs to the running loop.
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                print(f"❌ Outbox worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def drain(self) -> int:
+        """Deliver due messages until none are left; returns how many were sent."""
+        sent = 0
+        while rows := await self.claim():
+            sent += await self.deliver(rows)
+        async with self.session_factory() as db:
+            depth = await db.scalar(select(func.count(EmailOutbox.id)).where(EmailOutbox.status == "pending"))
+        queue_depth.set(depth or 0)
+        return sent
+
+    async def claim(self) -> list[EmailOutbox]:
+        now = utcnow()
+        due = (
+            (EmailOutbox.status == "pending")
+            & (EmailOutbox.next_attempt_at <= now)
+            & (EmailOutbox.claimed_until.is_(None) | (EmailOutbox.claimed_until < now))
+        )
+        token = uuid.uuid4().hex
+        async with self.session_factory() as db:
+            ids = (
+                await db.scalars(select(EmailOutbox.id).where(due).order_by(EmailOutbox.id).limit(self.batch_size))
+            ).all()
+            if not ids:
+                return []
+            # Re-checking `due` in the UPDATE means a row claimed concurrently
+            # by another worker is skipped rather than sent twice.
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(ids) & due)
+                .values(claim_token=token, claimed_until=now + timedelta(seconds=OUTBOX_LEASE_SECONDS)),
+                execution_options={"synchronize_session": False},
+            )
+            await db.commit()
+            return (await db.scalars(select(EmailOutbox).where(EmailOutbox.claim_token == token))).all()
+
+    async def deliver(self, rows: list[EmailOutbox]) -> int:
+        batches = []
+        by_provider = defaultdict(list)
+        for row in rows:
+            by_provider[row.provider].append(row)
+        for provider, provider_rows in by_provider.items():
+            size = self.transports.get(provider, self.default_transport).batch_size
+            batches += [(provider, provider_rows[i:i + size]) for i in range(0, len(provider_rows), size)]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(provider: str, batch: list[EmailOutbox]):
+            async with semaphore:
+                if provider in self.limiters:
+                    await self.limiters[provider].acquire()
+                try:
+                    transport = self.transports.get(provider, self.default_transport)
+                    await transport.send_batch([json.loads(row.message) for row in batch])
+                    return batch, None
+                except Exception as e:
+                    return batch, e
+
+        outcomes = await asyncio.gather(*(send(provider, batch) for provider, batch in batches))
+        return await self.record(outcomes)
+
+    async def record(self, outcomes) -> int:
+        now = utcnow()
+        sent_ids, failed = [], defaultdict(list)
+        for batch, error in outcomes:
+            for row in batch:
+                if error is None:
+                    sent_ids.append(row.id)
+                    emails_delivered.inc(kind=row.kind, provider=row.provider)
+                    delivery_latency.observe((now - row.created_at).total_seconds(), kind=row.kind)
+                else:
+                    failed[(row.attempts + 1, str(error)[:1000])].append(row)
+                    email_failures.inc(kind=row.kind, provider=row.provider)
+
+        async with self.session_factory() as db:
+            if sent_ids:
+                await db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id.in_(sent_ids))
+                    .values(status="sent", sent_at=now, attempts=EmailOutbox.attempts + 1,
+                            claimed_until=None, claim_token=None),
+                    execution_options={"synchronize_session": False},
+                )
+            for (attempts, error), rows in failed.items():
+                values = {"attempts": attempts, "last_error": error, "claimed_until": None, "claim_token": None}
+                if attempts >= self.max_attempts:
+                    values["status"] = "dead"
+                    for row in rows:
+                        emails_dead_lettered.inc(kind=row.kind, provider=row.provider)
+                    print(f"💀 Giving up on {len(rows)} emails after {attempts} attempts: {error}")
+                else:
+                    delay = min(self.retry_base_seconds * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+                    values["next_attempt_at"] = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+                await db.execute(
+                    update(EmailOutbox).where(EmailOutbox.id.in_([row.id for row in rows])).values(**values),
+                    execution_options={"synchronize_session": False},
+                )
+            await db.commit()
+        return len(sent_ids)
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,116 @@
+import base64
+import json
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, noload
+
+from .serialization import FAST_SERIALIZATION, ORJSONResponse, build_rows, fast_path_supported
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+class PageParams:
+    """Keyset page request: `cursor` from the previous page's X-Next-Cursor
+    header, a page `limit` and an optional comma separated `fields` list."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=MAX_LIMIT)] = DEFAULT_LIMIT,
+        fields: Optional[str] = None,
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+PageDep = Annotated[PageParams, Depends()]
+
+
+async def paginate(db: AsyncSession, query, page: PageParams, model, response_model, timestamp_column,
+                   headers: Optional[dict] = None, fast: Optional[bool] = None):
+    """Run the `query` select newest first, keyed on (timestamp, id), and return
+    the page response, with any extra `headers`. Only the requested fields are
+    loaded when `fields` is set. `fast` (default: FAST_SERIALIZATION) selects
+    the column-based orjson path from `serialization`."""
+    id_column = model.id
+    if fast is None:
+        fast = FAST_SERIALIZATION
+
+    if page.fields is not None:
+        unknown = set(page.fields) - set(response_model.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+        names = ["id", *(name for name in page.fields if name != "id")]
+    else:
+        names = list(response_model.model_fields)
+    fast = fast and fast_path_supported(model, names)
+
+    columns = {"id", timestamp_column.key, *names} & set(model.__table__.columns.keys())
+    if fast:
+        query = query.with_only_columns(*(getattr(model, name) for name in sorted(columns)))
+    elif page.fields is not None:
+        query = query.options(load_only(*(getattr(model, name) for name in columns)))
+        # Eager relationships (note tags) cost a query of their own; skip them
+        # unless they were asked for.
+        skipped = [rel for rel in model.__mapper__.relationships if rel.key not in page.fields]
+        query = query.options(*(noload(getattr(model, rel.key)) for rel in skipped))
+
+    if page.cursor:
+        timestamp, last_id = decode_cursor(page.cursor)
+        query = query.where(
+            or_(
+                timestamp_column < timestamp,
+                and_(timestamp_column == timestamp, id_column < last_id),
+            )
+        )
+
+    query = query.order_by(timestamp_column.desc(), id_column.desc()).limit(page.limit + 1)
+    rows = (await (db.execute(query) if fast else db.scalars(query))).all()
+
+    headers = dict(headers or {})
+    if len(rows) > page.limit:
+        rows = rows[: page.limit]
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, timestamp_column.key), last.id)
+
+    if fast:
+        content = await build_rows(db, model, response_model, rows, names)
+        return ORJSONResponse(content=content, headers=headers)
+    if page.fields is None:
+        content = [response_model.model_validate(row) for row in rows]
+    else:
+        adapters = {
+            name: TypeAdapter(response_model.model_fields[name].annotation) for name in names
+        }
+        content = [
+            {name: adapters[name].validate_python(getattr(row, name), from_attributes=True) for name in names}
+            for row in rows
+        ]
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
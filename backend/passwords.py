@@ -0,0 +1,123 @@
+"""Argon2 password hashing off the event loop.
+
+Hashing and verification run in a bounded thread pool (argon2-cffi releases
+the GIL, so threads hash in parallel). At most HASH_QUEUE_LIMIT calls wait
+in the pool's queue at once; further callers wait on the event loop. Queue
+time and hashing time are recorded per operation.
+
+`calibrate()` runs at startup and picks the Argon2 time cost that brings one
+hash closest to ARGON2_TARGET_MS on this machine without going above it.
+ARGON2_TIME_COST pins the cost instead. When workers or hosts may calibrate
+differently, pin it, otherwise logins keep upgrading hashes between them.
+Stored hashes weaker than the current parameters are rehashed on login.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import argon2
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from .metrics import Histogram
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+ARGON2_TARGET_MS = float(os.getenv("ARGON2_TARGET_MS", "250"))
+ARGON2_TIME_COST = os.getenv("ARGON2_TIME_COST")
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", str(argon2.DEFAULT_MEMORY_COST)))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", str(argon2.DEFAULT_PARALLELISM)))
+MIN_TIME_COST = 2
+MAX_TIME_COST = 20
+
+hash_queue_time = Histogram("lumina_password_hash_queue_seconds", "Time waiting for a hashing worker")
+hash_duration = Histogram("lumina_password_hash_seconds", "Time spent hashing or verifying a password")
+
+
+def build_hasher(time_cost: int) -> PasswordHash:
+    return PasswordHash(
+        (Argon2Hasher(time_cost=time_cost, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM),)
+    )
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.time_cost = int(ARGON2_TIME_COST or argon2.DEFAULT_TIME_COST)
+        self.password_hash = build_hasher(self.time_cost)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self._slots = asyncio.Semaphore(workers + queue_limit)
+
+    async def _run(self, operation: str, fn, *args):
+        queued = time.perf_counter()
+        async with self._slots:
+            def timed():
+                started = time.perf_counter()
+                hash_queue_time.observe(started - queued, operation=operation)
+                try:
+                    return fn(*args)
+                finally:
+                    hash_duration.observe(time.perf_counter() - started, operation=operation)
+
+            return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.password_hash.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", self.password_hash.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Verify, and return a new hash when the stored one is weaker than
+        the current parameters."""
+        valid = await self.verify(password, hashed_password)
+        if not valid or not self.needs_upgrade(hashed_password):
+            return valid, None
+        return True, await self.hash(password)
+
+    def needs_upgrade(self, hashed_password: str) -> bool:
+        # Only upgrade: a stored hash stronger than ours (e.g. from a slower
+        # calibration elsewhere) is left alone instead of being downgraded.
+        try:
+            params = argon2.extract_parameters(hashed_password)
+        except argon2.exceptions.InvalidHashError:
+            return True
+        return (
+            params.type != argon2.Type.ID
+            or params.time_cost < self.time_cost
+            or params.memory_cost < ARGON2_MEMORY_COST
+        )
+
+    def _measure(self, time_cost: int, rounds: int = 3) -> float:
+        hasher = build_hasher(time_cost)
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            hasher.hash("calibration password")
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)[len(timings) // 2] * 1000
+
+    def _calibrate(self, target_ms: float) -> tuple[int, float]:
+        time_cost, elapsed = MIN_TIME_COST, self._measure(MIN_TIME_COST)
+        # Cost grows linearly with time_cost, so estimate then verify.
+        per_pass = elapsed / MIN_TIME_COST
+        candidate = max(MIN_TIME_COST, min(MAX_TIME_COST, int(target_ms // per_pass)))
+        while candidate > time_cost:
+            candidate_ms = self._measure(candidate)
+            if candidate_ms <= target_ms:
+                time_cost, elapsed = candidate, candidate_ms
+                break
+            candidate -= 1
+        return time_cost, elapsed
+
+    async def calibrate(self, target_ms: float = ARGON2_TARGET_MS) -> None:
+        if ARGON2_TIME_COST:
+            print(f"🔐 Argon2 time_cost pinned to {self.time_cost}")
+            return
+        loop = asyncio.get_running_loop()
+        self.time_cost, elapsed = await loop.run_in_executor(self.executor, self._calibrate, target_ms)
+        self.password_hash = build_hasher(self.time_cost)
+        print(f"🔐 Argon2 calibrated: time_cost={self.time_cost}, ~{elapsed:.0f} ms per hash")
+
+
+password_hasher = PasswordHasher()
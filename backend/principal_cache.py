@@ -0,0 +1,94 @@
+"""Cache of authenticated users for `get_current_user`.
+
+Entries are keyed by (user id, token) and hold a snapshot of the User row's
+columns, so a hit rebuilds the principal and attaches it to the request's
+session without a SELECT. Entries expire after a TTL (or with the token,
+whichever is first) and the least recently used ones are evicted past
+`maxsize`. Handlers that change the user row call `invalidate(user_id)`.
+
+The cache is per process and `invalidate` only reaches the current one, so
+`get_current_user` only consults it for reads: write requests always load
+the user, so a deleted account is refused by every worker at once. A read
+served by another worker may see a stale (or deleted) principal for at most
+the TTL, which is why it defaults to a few seconds; handlers that depend
+on fresh values (e.g. the verification code) refresh the user first.
+"""
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from .metrics import Counter
+from .schemas import User
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "10"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+cache_hits = Counter("lumina_auth_cache_hits_total", "Authenticated user cache hits")
+cache_misses = Counter("lumina_auth_cache_misses_total", "Authenticated user cache misses")
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = AUTH_CACHE_TTL_SECONDS, maxsize: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[int, str], tuple[float, dict]] = OrderedDict()
+        self._keys_by_user: dict[int, set[tuple[int, str]]] = {}
+
+    def get(self, db: AsyncSession, user_id: int, token: str) -> User | None:
+        """The cached user attached to `db`, or None on a miss."""
+        key = (user_id, token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            cache_misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        cache_hits.inc()
+
+        # A fresh instance per request: the caller's session owns it and may
+        # modify it without touching the cached snapshot.
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+
+    def put(self, user: User, token: str, token_expires: float | None = None) -> None:
+        """Cache `user` for `token`; `token_expires` is the JWT exp (epoch seconds)."""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        ttl = self.ttl
+        if token_expires is not None:
+            ttl = min(ttl, token_expires - time.time())
+        if ttl <= 0:
+            return
+        key = (user.id, token)
+        snapshot = {column.key: getattr(user, column.key) for column in User.__mapper__.column_attrs}
+        self._entries[key] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(user.id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every cached token of `user_id`."""
+        for key in self._keys_by_user.pop(user_id, ()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    def _remove(self, key: tuple[int, str]) -> None:
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+
+principal_cache = PrincipalCache()
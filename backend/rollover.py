@@ -0,0 +1,106 @@
+"""Moving overdue, incomplete todos forward to today.
+
+A rollover is one UPDATE that keeps each todo's time of day and swaps its
+date for today. `User.last_rolled_over` records the day a user was last
+rolled over, so reading today's todos rolls over at most once per day, and
+the midnight job pre-rolls every user so the read path normally never
+writes.
+"""
+from datetime import date, datetime, timezone
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .dates import at_day, before_day
+from .changes import record_users_updates
+from .db import record_write
+from .principal_cache import principal_cache
+from .schemas import Todo, User
+from .versions import bump_users_versions, bump_version
+
+
+def overdue(today: date):
+    return before_day(Todo.entry_datetime, today) & (Todo.status == False)
+
+
+def roll_over_todos(today: date, *criteria):
+    return (
+        update(Todo)
+        .where(overdue(today), *criteria)
+        .values(
+            entry_datetime=at_day(Todo.entry_datetime, today),
+            edited=True,
+            edited_datetime=datetime.now(timezone.utc),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def not_rolled_over(today: date):
+    return or_(User.last_rolled_over.is_(None), User.last_rolled_over < today)
+
+
+async def roll_over_if_due(db: AsyncSession, user: User, today: date) -> bool:
+    """Roll over `user`'s todos unless that already happened today. Commits."""
+    if not user.rollover or (user.last_rolled_over is not None and user.last_rolled_over >= today):
+        return False
+    # Claiming the day first means concurrent requests roll over only once.
+    claimed = await db.execute(
+        update(User)
+        .where((User.id == user.id) & not_rolled_over(today))
+        .values(last_rolled_over=today)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount:
+        ids = (await db.scalars(select(Todo.id).where(overdue(today) & (Todo.user_id == user.id)))).all()
+        if ids:
+            await db.execute(roll_over_todos(today, Todo.id.in_(ids)))
+            await bump_version(db, user.id, "todos", updated=ids)
+            # A GET that wrote: keep this user's reads on the primary.
+            record_write()
+    await db.commit()
+    set_committed_value(user, "last_rolled_over", today)
+    principal_cache.invalidate(user.id)
+    return bool(claimed.rowcount)
+
+
+async def roll_over_user(db: AsyncSession, user: User, today: date) -> list[Todo]:
+    """Roll over `user`'s todos now and return the moved rows. Commits."""
+    ids = (await db.scalars(select(Todo.id).where(overdue(today) & (Todo.user_id == user.id)))).all()
+    if ids:
+        await db.execute(roll_over_todos(today, Todo.id.in_(ids)))
+        await bump_version(db, user.id, "todos", updated=ids)
+    await db.execute(
+        update(User)
+        .where((User.id == user.id) & not_rolled_over(today))
+        .values(last_rolled_over=today)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    if not ids:
+        return []
+    return (
+        await db.scalars(select(Todo).where(Todo.id.in_(ids)).execution_options(populate_existing=True))
+    ).all()
+
+
+async def roll_over_all_users(db: AsyncSession, today: date) -> int:
+    """Roll over every rollover-enabled user not yet rolled over today."""
+    due_users = select(User.id).where((User.rollover == True) & not_rolled_over(today))
+    due_todos = select(Todo.user_id, Todo.id).where(overdue(today) & Todo.user_id.in_(due_users))
+    # Versions and change records first: once moved, the todos no longer
+    # match `overdue`.
+    await bump_users_versions(db, due_todos.with_only_columns(Todo.user_id).distinct(), "todos")
+    await record_users_updates(db, "todos", due_todos)
+    moved = await db.execute(roll_over_todos(today, Todo.user_id.in_(due_users)))
+    await db.execute(
+        update(User)
+        .where((User.rollover == True) & not_rolled_over(today))
+        .values(last_rolled_over=today)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    principal_cache.clear()
+    return moved.rowcount
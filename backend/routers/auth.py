@@ -3,20 +3,22 @@ import os
 from typing import Annotated
 
 from dotenv import load_dotenv
-from fastapi import Depends, status, HTTPException, APIRouter
+from fastapi import Depends, Request, status, HTTPException, APIRouter
 from fastapi.security import (
     OAuth2PasswordRequestForm,
     HTTPBearer,
     HTTPAuthorizationCredentials,
 )
-from sqlalchemy.orm import Session
-from pwdlib import PasswordHash
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 from jwt import PyJWTError
 
-from ..db import get_session, SessionDep
+from ..db import get_session, SessionDep, SAFE_METHODS
 from ..models import Token, TokenData, CreateUser, ReturnUser
 from ..schemas import User
+from ..principal_cache import principal_cache
+from ..passwords import password_hasher
 
 load_dotenv()
 
@@ -32,28 +34,33 @@ router = APIRouter(
     tags=["auth"],
 )
 
-password_hash = PasswordHash.recommended()
 bearer_scheme = HTTPBearer()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return password_hash.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-    return password_hash.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
-def get_user_by_id(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    return await db.scalar(select(User).where(User.id == user_id))
 
 
-def authenticate_user(username: str, password: str, db: Session) -> User | None:
-    db_user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(username: str, password: str, db: AsyncSession) -> User | None:
+    db_user = await db.scalar(select(User).where(User.username == username))
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    valid, updated_hash = await password_hasher.verify_and_update(password, db_user.hashed_password)
+    if not valid:
         return None
+    if updated_hash is not None:
+        # Stored with weaker Argon2 parameters than the current ones.
+        db_user.hashed_password = updated_hash
+        await db.commit()
+        principal_cache.invalidate(db_user.id)
     return db_user
 
 
@@ -69,8 +76,9 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
 
 async def get_current_user(
+    request: Request,
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)],
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_session),
 ):
     token = credentials.credentials
     credentials_exception = HTTPException(
@@ -92,9 +100,17 @@ async def get_current_user(
     except (TypeError, ValueError):
         raise credentials_exception
 
-    user = get_user_by_id(db, user_id=user_id)
+    # Writes always load the user, so an account deleted or changed through
+    # another worker is refused (or seen as changed) at once; reads may use
+    # the cache, which is at most AUTH_CACHE_TTL_SECONDS stale.
+    user = principal_cache.get(db, user_id, token) if request.method in SAFE_METHODS else None
     if user is None:
-        raise credentials_exception
+        user = await get_user_by_id(db, user_id=user_id)
+        if user is None:
+            raise credentials_exception
+        principal_cache.put(user, token, payload.get("exp"))
+
+    request.state.user_id = user.id
     return user
 
 
@@ -105,20 +121,20 @@ FormDep = Annotated[OAuth2PasswordRequestForm, Depends()]
 @router.post("/register", response_model=ReturnUser, status_code=status.HTTP_201_CREATED)
 async def create_user(user: CreateUser, db: SessionDep):
     db_user = User(
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await get_password_hash(user.password),
         email=user.email,
         username=user.username,
         role=user.role,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/login", response_model=Token, status_code=status.HTTP_200_OK)
 async def login(form_data: FormDep, db: SessionDep):
-    user = authenticate_user(
+    user = await authenticate_user(
         username=form_data.username,
         password=form_data.password,
         db=db,
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, status
+from sqlalchemy import func, select, Date
+from datetime import date, timedelta
+from ..models import DashboardSummary
+from ..schemas import Todo, Diary, Note, Goal
+from .auth import UserDep
+from ..db import ReadSessionDep
+from ..dates import on_day
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["dashboard"],
+)
+
+
+async def count_rows(db: ReadSessionDep, column, *criteria) -> int:
+    return await db.scalar(select(func.count(column)).where(*criteria)) or 0
+
+
+async def completion_streak(db: ReadSessionDep, user_id: int, today: date) -> int:
+    completed_day = func.date(Todo.completed_datetime, type_=Date)
+    days = await db.execute(
+        select(completed_day)
+        .where(
+            (Todo.user_id == user_id)
+            & (Todo.status == True)
+            & (Todo.completed_datetime.isnot(None))
+        )
+        .group_by(completed_day)
+        .order_by(completed_day.desc())
+    )
+
+    # Consecutive days with at least one completed task. Today may still be
+    # in progress, so an empty today does not break a streak ending yesterday.
+    streak = 0
+    check_date = today
+    for (day,) in days:
+        if day > check_date:
+            continue
+        if day == check_date:
+            streak += 1
+            check_date -= timedelta(days=1)
+        elif streak == 0 and check_date == today and day == today - timedelta(days=1):
+            streak += 1
+            check_date = day - timedelta(days=1)
+        else:
+            break
+    return streak
+
+
+@router.get("/summary", response_model=DashboardSummary, status_code=status.HTTP_200_OK)
+async def get_summary(db: ReadSessionDep, user: UserDep):
+    today = date.today()
+    return DashboardSummary(
+        pending_todos=await count_rows(db, Todo.id, Todo.user_id == user.id, Todo.status == False),
+        diary_entries_today=await count_rows(
+            db, Diary.id, Diary.user_id == user.id, on_day(Diary.entry_datetime, today)
+        ),
+        notes=await count_rows(db, Note.id, Note.user_id == user.id),
+        active_goals=await count_rows(db, Goal.id, Goal.user_id == user.id, Goal.is_completed == False),
+        streak=await completion_streak(db, user.id, today),
+    )
@@ -1,15 +1,23 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import func
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, status
+from sqlalchemy import select
+from typing import Annotated, List
 from ..models import (
     CreateDiary,
     UpdateDiary,
     ReturnDiary,
+    DiaryBatch,
+    BatchResult,
 )
 from ..schemas import Diary
 from datetime import datetime, date, timezone
 from .auth import UserDep
-from ..db import SessionDep
+from ..db import ReadSessionDep, SessionDep
+from ..dates import on_day
+from ..pagination import PageDep, paginate, MAX_LIMIT
+from ..search import search_backend
+from ..batch import run_batch
+from ..versions import DiariesVersion, bump_version, etag_headers
+from ..export import DIARIES, ExportFormat, export_response
  
 router = APIRouter(
     prefix="/diaries",
@@ -19,35 +27,44 @@ router = APIRouter(
 
 
 @router.get("/search", response_model=List[ReturnDiary],status_code=status.HTTP_200_OK)
-async def search_diary(query : str , db : SessionDep, user_model : UserDep):
-    search = f"%{query}%"
-    results = db.query(Diary).filter(((Diary.title.ilike(search)) | (Diary.content.ilike(search))) & (Diary.user_id == user_model.id)).all() 
-    if not results:
-        return []
-    else:
-        return results 
+async def search_diary(query : str , db : ReadSessionDep, user_model : UserDep,
+        limit : Annotated[int, Query(ge=1, le=MAX_LIMIT)] = 50):
+    return await search_backend.search(db, Diary, query, Diary.user_id == user_model.id, limit=limit) 
 
 
 @router.get('/',response_model=List[ReturnDiary],status_code=status.HTTP_200_OK)
-async def get_all(db : SessionDep, user: UserDep):
-    diaries = db.query(Diary).filter(Diary.user_id==user.id).all() 
-    return diaries 
+async def get_all(db : ReadSessionDep, user: UserDep, page : PageDep, etag : DiariesVersion):
+    query = select(Diary).where(Diary.user_id==user.id)
+    return await paginate(db, query, page, Diary, ReturnDiary, Diary.entry_datetime, headers=etag_headers(etag))
+
+
 
+@router.get('/export',status_code=status.HTTP_200_OK)
+async def export_diaries(user : UserDep, format : ExportFormat = "markdown"):
+    return export_response(DIARIES, user.id, format)
 
 
 @router.get('/date/{entry_date}',response_model=List[ReturnDiary],status_code=status.HTTP_200_OK)
-async def get_diary_by_date(entry_date: date, db:SessionDep, user : UserDep):
-    diaries = db.query(Diary).filter((func.date(Diary.entry_datetime) == entry_date) & (Diary.user_id == user.id)).all() 
+async def get_diary_by_date(entry_date: date, db:ReadSessionDep, user : UserDep, etag : DiariesVersion):
+    diaries = (await db.scalars(select(Diary).where(on_day(Diary.entry_datetime, entry_date) & (Diary.user_id == user.id)))).all() 
     return diaries
 
 @router.get('/{id}',response_model=ReturnDiary,status_code=status.HTTP_200_OK)
-async def get_by_id(id : int , db : SessionDep, user : UserDep):
-    diary = db.query(Diary).filter((Diary.id == id) & (Diary.user_id == user.id)).first() 
+async def get_by_id(id : int , db : ReadSessionDep, user : UserDep, etag : DiariesVersion):
+    diary = await db.scalar(select(Diary).where((Diary.id == id) & (Diary.user_id == user.id))) 
     if not diary:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No diary Found")
     else:
         return diary 
 
+@router.post("/batch",response_model=List[BatchResult],status_code=status.HTTP_200_OK)
+async def batch_diaries(batch : DiaryBatch, db : SessionDep, user : UserDep):
+    def create_rows(items):
+        return [{"title": item.title, "content": item.content, "user_id": user.id} for item in items]
+
+    return await run_batch(db, Diary, user.id, batch.operations, create_rows)
+
+
 @router.post("/",response_model=ReturnDiary,status_code=status.HTTP_201_CREATED)
 async def create_diary(diary : CreateDiary,  db : SessionDep, user : UserDep):
     db_diary = Diary(
@@ -56,23 +73,26 @@ async def create_diary(diary : CreateDiary,  db : SessionDep, user : UserDep):
         user_id = user.id 
     )
     db.add(db_diary)
-    db.commit()
-    db.refresh(db_diary) 
+    await db.flush()
+    await bump_version(db, user.id, "diaries", created=[db_diary.id])
+    await db.commit()
+    await db.refresh(db_diary) 
     return db_diary
  
 @router.delete('/{id}',status_code=status.HTTP_200_OK)
 async def delete_diary(id : int , db : SessionDep, user : UserDep):
-    diary = db.query(Diary).filter((Diary.id == id) & (Diary.user_id == user.id)).first() 
+    diary = await db.scalar(select(Diary).where((Diary.id == id) & (Diary.user_id == user.id))) 
     if not diary:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Diary Not Found")
     else:
-        db.delete(diary) 
-        db.commit() 
+        await db.delete(diary) 
+        await bump_version(db, user.id, "diaries", deleted=[id])
+        await db.commit() 
         return {"response" : f"Dairy with {id} deleted"}
     
 @router.put('/{id}', response_model=ReturnDiary,status_code=status.HTTP_200_OK)
 async def update_diary_id(id : int ,diary : UpdateDiary ,  db : SessionDep, user:UserDep):
-    db_diary = db.query(Diary).filter((Diary.id == id) & (Diary.user_id == user.id)).first() 
+    db_diary = await db.scalar(select(Diary).where((Diary.id == id) & (Diary.user_id == user.id))) 
     if not db_diary:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Diary not found")  
     else:
@@ -80,7 +100,8 @@ async def update_diary_id(id : int ,diary : UpdateDiary ,  db : SessionDep, user
         db_diary.content = diary.content
         db_diary.edited = True 
         db_diary.edited_datetime = datetime.now(timezone.utc) 
-        db.commit() 
-        db.refresh(db_diary)
+        await bump_version(db, user.id, "diaries", updated=[id])
+        await db.commit() 
+        await db.refresh(db_diary)
         return db_diary
 
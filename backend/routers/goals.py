@@ -1,14 +1,21 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, status
+from sqlalchemy import select
+from typing import Annotated, List
 from ..models import (
     CreateGoal,
     UpdateGoal,
     ReturnGoal,
+    GoalBatch,
+    BatchResult,
 )
 from ..schemas import Goal 
 from datetime import datetime, timezone
 from .auth import UserDep
-from ..db import SessionDep
+from ..db import ReadSessionDep, SessionDep
+from ..pagination import PageDep, paginate, MAX_LIMIT
+from ..search import search_backend
+from ..batch import run_batch
+from ..versions import GoalsVersion, bump_version, etag_headers
 
 
 router = APIRouter(
@@ -19,22 +26,18 @@ router = APIRouter(
 
 
 @router.get("/search", response_model=List[ReturnGoal],status_code=status.HTTP_200_OK)
-async def search_goal(query : str , db : SessionDep, user_model : UserDep):
-    search = f"%{query}%"
-    results = db.query(Goal).filter(((Goal.title.ilike(search)) | (Goal.description.ilike(search))) & (Goal.user_id == user_model.id)).all() 
-    if not results:
-        return []
-    else:
-        return results 
+async def search_goal(query : str , db : ReadSessionDep, user_model : UserDep,
+        limit : Annotated[int, Query(ge=1, le=MAX_LIMIT)] = 50):
+    return await search_backend.search(db, Goal, query, Goal.user_id == user_model.id, limit=limit) 
 
 @router.get("/",status_code=status.HTTP_200_OK,response_model=List[ReturnGoal])
-async def get_all_goals(user : UserDep, db : SessionDep ):
-    goals= db.query(Goal).filter((Goal.user_id==user.id)).all() 
-    return goals 
+async def get_all_goals(user : UserDep, db : ReadSessionDep, page : PageDep, etag : GoalsVersion):
+    query = select(Goal).where((Goal.user_id==user.id))
+    return await paginate(db, query, page, Goal, ReturnGoal, Goal.created_at, headers=etag_headers(etag))
 
 @router.get("/{id}",status_code=status.HTTP_200_OK,response_model=ReturnGoal)
-async def get_all_goals_id(user : UserDep, db : SessionDep , id : int):
-    goal = db.query(Goal).filter((Goal.user_id==user.id) & (Goal.id == id)).first() 
+async def get_all_goals_id(user : UserDep, db : ReadSessionDep , id : int, etag : GoalsVersion):
+    goal = await db.scalar(select(Goal).where((Goal.user_id==user.id) & (Goal.id == id))) 
     if not goal:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Goal Not Found")
     else:
@@ -42,6 +45,21 @@ async def get_all_goals_id(user : UserDep, db : SessionDep , id : int):
 
 
 
+def status_values(done : bool, now : datetime) -> dict:
+    return {"is_completed": done, "completed_at": now if done else None}
+
+
+@router.post("/batch",status_code=status.HTTP_200_OK,response_model=List[BatchResult])
+async def batch_goals(batch : GoalBatch, db : SessionDep, user : UserDep):
+    def create_rows(items):
+        return [
+            {"title": item.title, "description": item.description, "user_id": user.id, "target_date": item.target_date}
+            for item in items
+        ]
+
+    return await run_batch(db, Goal, user.id, batch.operations, create_rows, status_values)
+
+
 @router.post("/",status_code=status.HTTP_201_CREATED,response_model=ReturnGoal)
 async def create_goal(user : UserDep, db : SessionDep,goal : CreateGoal):
     db_goal = Goal(
@@ -51,42 +69,47 @@ async def create_goal(user : UserDep, db : SessionDep,goal : CreateGoal):
         target_date=goal.target_date,
     )
     db.add(db_goal)
-    db.commit()
-    db.refresh(db_goal)
+    await db.flush()
+    await bump_version(db, user.id, "goals", created=[db_goal.id])
+    await db.commit()
+    await db.refresh(db_goal)
     return db_goal
 
 @router.put("/{id}",status_code=status.HTTP_200_OK,response_model=ReturnGoal)
 async def update_goal(id: int, user : UserDep, db : SessionDep, goal : UpdateGoal):
-    db_goal = db.query(Goal).filter((Goal.user_id==user.id) & (Goal.id == id)).first() 
+    db_goal = await db.scalar(select(Goal).where((Goal.user_id==user.id) & (Goal.id == id))) 
     if not db_goal:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Goal Not Found")
     db_goal.title = goal.title
     db_goal.description = goal.description
     db_goal.target_date = goal.target_date
     db_goal.updated_at = datetime.now(timezone.utc)
-    db.commit()
-    db.refresh(db_goal)
+    await bump_version(db, user.id, "goals", updated=[id])
+    await db.commit()
+    await db.refresh(db_goal)
     return db_goal
 
 
 @router.put("/complete/{id}",status_code=status.HTTP_200_OK,response_model=ReturnGoal)
 async def complete_goal(id: int, user : UserDep, db : SessionDep):
-    db_goal = db.query(Goal).filter((Goal.user_id==user.id) & (Goal.id == id)).first() 
+    db_goal = await db.scalar(select(Goal).where((Goal.user_id==user.id) & (Goal.id == id))) 
     if not db_goal:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Goal Not Found")
     db_goal.is_completed = True
     db_goal.completed_at = datetime.now(timezone.utc)
-    db.commit()
-    db.refresh(db_goal)
+    await bump_version(db, user.id, "goals", updated=[id])
+    await db.commit()
+    await db.refresh(db_goal)
     return db_goal
 
 @router.delete("/{id}",status_code=status.HTTP_200_OK)
 async def delete_goal(id: int, user : UserDep, db : SessionDep):
-    db_goal = db.query(Goal).filter((Goal.user_id==user.id) & (Goal.id == id)).first() 
+    db_goal = await db.scalar(select(Goal).where((Goal.user_id==user.id) & (Goal.id == id))) 
     if not db_goal:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Goal Not Found")
-    db.delete(db_goal)
-    db.commit()
+    await db.delete(db_goal)
+    await bump_version(db, user.id, "goals", deleted=[id])
+    await db.commit()
     return {"detail": f"Goal with id {id} deleted"}
 
 
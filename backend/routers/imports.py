@@ -0,0 +1,24 @@
+from fastapi import APIRouter, UploadFile, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from .auth import UserDep
+from ..imports import ImportFormat, RecordType, import_stream
+
+router = APIRouter(
+    prefix="/import",
+    tags=["import"],
+)
+
+
+@router.post("", status_code=status.HTTP_200_OK)
+async def import_entries(
+    file: UploadFile,
+    user: UserDep,
+    format: Optional[ImportFormat] = None,
+    type: Optional[RecordType] = None,
+):
+    # Records without a "type" (e.g. the lines of a notes NDJSON export)
+    # are taken to be `type`.
+    if format is None:
+        format = "zip" if (file.filename or "").lower().endswith(".zip") else "ndjson"
+    return StreamingResponse(import_stream(file, format, user.id, type), media_type="application/x-ndjson")
@@ -1,16 +1,26 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import func
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, status
+from sqlalchemy import delete, false, func, select
+from typing import Annotated, List, Literal, Optional
 
 from ..models import (
     CreateNote,
     UpdateNote,
     ReturnNote,
+    TagCount,
+    NoteBatch,
+    BatchResult,
 )
-from ..schemas import Note,Tag 
+from ..schemas import Note, Tag, note_tags
 from datetime import datetime, date, timezone
 from .auth import UserDep
-from ..db import SessionDep
+from ..db import ReadSessionDep, SessionDep
+from ..dates import on_day
+from ..pagination import PageDep, paginate, MAX_LIMIT
+from ..search import search_backend
+from ..tags import clean_tag_names, link_note_tags, lookup_tag_ids, resolve_tags
+from ..batch import run_batch
+from ..versions import NotesVersion, bump_version, etag_headers
+from ..export import NOTES, ExportFormat, export_response
 
 
 router = APIRouter(
@@ -18,55 +28,95 @@ router = APIRouter(
     tags=["notes"],
 )
 
-def process_tags(db: SessionDep, tag_names : List[str]):
-    objects = [] 
-    for name in tag_names:
-        clean_name = name.strip().lower() 
-        if not clean_name:
-            continue 
-        tag = db.query(Tag).filter(Tag.name == clean_name).first() 
-        if not tag:
-            tag = Tag(name=clean_name)
-            db.add(tag)
-            db.flush() 
-        
-        objects.append(tag)
-    return objects 
-
 
 @router.get("/search", response_model=List[ReturnNote],status_code=status.HTTP_200_OK)
-async def search_note(query : str , db : SessionDep, user_model : UserDep):
-    search = f"%{query}%"
-    results = db.query(Note).filter(((Note.title.ilike(search)) | (Note.content.ilike(search))) & (Note.user_id == user_model.id)).all() 
-    if not results:
-        return []
-    else:
-        return results 
+async def search_note(query : str , db : ReadSessionDep, user_model : UserDep,
+        limit : Annotated[int, Query(ge=1, le=MAX_LIMIT)] = 50):
+    return await search_backend.search(db, Note, query, Note.user_id == user_model.id, limit=limit) 
 
 
 @router.get('/',response_model=List[ReturnNote],status_code=status.HTTP_200_OK)
-async def get_all_notes(db : SessionDep, user: UserDep):
-    notes = db.query(Note).filter(Note.user_id==user.id).all() 
-    return notes 
+async def get_all_notes(db : ReadSessionDep, user: UserDep, page : PageDep,
+        tag : Annotated[Optional[List[str]], Query()] = None,
+        match : Literal["all", "any"] = "all", etag : NotesVersion = None):
+    query = select(Note).where(Note.user_id==user.id)
+    names = clean_tag_names(tag or [])
+    if names:
+        tag_ids = list((await lookup_tag_ids(db, names)).values())
+        if not tag_ids or (match == "all" and len(tag_ids) < len(names)):
+            return await paginate(db, query.where(false()), page, Note, ReturnNote, Note.created_at, headers=etag_headers(etag))
+        # Served by the (tag_id, note_id) primary key.
+        tagged = select(note_tags.c.note_id).where(note_tags.c.tag_id.in_(tag_ids))
+        if match == "all":
+            tagged = tagged.group_by(note_tags.c.note_id).having(func.count() == len(tag_ids))
+        query = query.where(Note.id.in_(tagged))
+    return await paginate(db, query, page, Note, ReturnNote, Note.created_at, headers=etag_headers(etag))
+
+
+@router.get('/tags',response_model=List[TagCount],status_code=status.HTTP_200_OK)
+async def get_tag_counts(db : ReadSessionDep, user : UserDep, etag : NotesVersion):
+    count = func.count(note_tags.c.note_id)
+    rows = await db.execute(
+        select(Tag.id, Tag.name, count.label("count"))
+        .join(note_tags, note_tags.c.tag_id == Tag.id)
+        .join(Note, Note.id == note_tags.c.note_id)
+        .where(Note.user_id == user.id)
+        .group_by(Tag.id, Tag.name)
+        .order_by(count.desc(), Tag.name)
+    )
+    return [TagCount(id=id, name=name, count=count) for id, name, count in rows]
+
 
 
+@router.get('/export',status_code=status.HTTP_200_OK)
+async def export_notes(user : UserDep, format : ExportFormat = "markdown"):
+    return export_response(NOTES, user.id, format)
+
 
 @router.get('/date/{created_date}',response_model=List[ReturnNote],status_code=status.HTTP_200_OK)
-async def get_note_by_date(created_date: date, db:SessionDep, user : UserDep):
-    notes = db.query(Note).filter((func.date(Note.created_at) == created_date) & (Note.user_id == user.id)).all() 
+async def get_note_by_date(created_date: date, db:ReadSessionDep, user : UserDep, etag : NotesVersion):
+    notes = (await db.scalars(select(Note).where(on_day(Note.created_at, created_date) & (Note.user_id == user.id)))).all() 
     return notes
 
 @router.get('/{id}',response_model=ReturnNote,status_code=status.HTTP_200_OK)
-async def get_by_id(id : int , db : SessionDep, user : UserDep):
-    note = db.query(Note).filter((Note.id == id) & (Note.user_id == user.id)).first() 
+async def get_by_id(id : int , db : ReadSessionDep, user : UserDep, etag : NotesVersion):
+    note = await db.scalar(select(Note).where((Note.id == id) & (Note.user_id == user.id))) 
     if not note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No note Found")
     else:
         return note 
 
+def status_values(archived : bool, now : datetime) -> dict:
+    return {"is_archived": archived}
+
+
+async def delete_note_tags(db : SessionDep, note_ids : List[int]):
+    await db.execute(delete(note_tags).where(note_tags.c.note_id.in_(note_ids)))
+
+
+@router.post("/batch",response_model=List[BatchResult],status_code=status.HTTP_200_OK)
+async def batch_notes(batch : NoteBatch, db : SessionDep, user : UserDep):
+    def create_rows(items):
+        return [
+            {
+                "title": item.title,
+                "content": item.content,
+                "user_id": user.id,
+                "is_pinned": item.is_pinned,
+                "is_archived": item.is_archived,
+            }
+            for item in items
+        ]
+
+    async def link_tags(db, note_ids, items):
+        await link_note_tags(db, note_ids, [item.tags for item in items])
+
+    return await run_batch(db, Note, user.id, batch.operations, create_rows, status_values, delete_note_tags, link_tags)
+
+
 @router.post("/",response_model=ReturnNote,status_code=status.HTTP_201_CREATED)
 async def create_note(note : CreateNote,  db : SessionDep, user : UserDep):
-    tag_objects = process_tags(db , note.tags)
+    tag_objects = await resolve_tags(db, note.tags)
     db_note = Note(
         title= note.title,
         content= note.content,
@@ -76,23 +126,26 @@ async def create_note(note : CreateNote,  db : SessionDep, user : UserDep):
         tags= tag_objects 
     )
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note) 
+    await db.flush()
+    await bump_version(db, user.id, "notes", created=[db_note.id])
+    await db.commit()
+    await db.refresh(db_note) 
     return db_note
  
 @router.delete('/{id}',status_code=status.HTTP_200_OK)
 async def delete_note(id : int , db : SessionDep, user : UserDep):
-    note = db.query(Note).filter((Note.id == id) & (Note.user_id == user.id)).first() 
+    note = await db.scalar(select(Note).where((Note.id == id) & (Note.user_id == user.id))) 
     if not note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Note Not Found")
     else:
-        db.delete(note) 
-        db.commit() 
+        await db.delete(note) 
+        await bump_version(db, user.id, "notes", deleted=[id])
+        await db.commit() 
         return {"response" : f"Note with {id} deleted"}
     
 @router.put('/{id}', response_model=ReturnNote,status_code=status.HTTP_200_OK)
 async def update_note_id(id : int ,note : UpdateNote ,  db : SessionDep, user:UserDep):
-    db_note = db.query(Note).filter((Note.id == id) & (Note.user_id == user.id)).first() 
+    db_note = await db.scalar(select(Note).where((Note.id == id) & (Note.user_id == user.id))) 
     if not db_note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Note not found")  
     else:
@@ -103,11 +156,12 @@ async def update_note_id(id : int ,note : UpdateNote ,  db : SessionDep, user:Us
         db_note.is_archived = note.is_archived
 
         if note.tags is not None:
-            tag_objects = process_tags(db, note.tags)
+            tag_objects = await resolve_tags(db, note.tags)
             db_note.tags = tag_objects 
 
-        db.commit() 
-        db.refresh(db_note)
+        await bump_version(db, user.id, "notes", updated=[id])
+        await db.commit() 
+        await db.refresh(db_note)
         return db_note
 
 
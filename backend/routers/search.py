@@ -0,0 +1,56 @@
+import asyncio
+from fastapi import APIRouter, Query, status
+from typing import Annotated, List, Literal
+from ..models import SearchHit
+from ..schemas import Todo, Diary, Note, Goal
+from .auth import UserDep
+from ..db import ReadSessionLocal
+from ..search import SEARCH_COLUMNS, search_backend, search_terms, make_snippet
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+SearchType = Literal["todo", "diary", "note", "goal"]
+
+SEARCH_TYPES = {
+    "todo": (Todo, Todo.entry_datetime),
+    "diary": (Diary, Diary.entry_datetime),
+    "note": (Note, Note.created_at),
+    "goal": (Goal, Goal.created_at),
+}
+
+
+async def search_type(type_name: str, query: str, user_id: int, limit: int) -> list[SearchHit]:
+    model, timestamp_column = SEARCH_TYPES[type_name]
+    title_column, body_column = SEARCH_COLUMNS[model]
+    terms = search_terms(query)
+    async with ReadSessionLocal(info={"user_id": user_id}) as db:
+        results = await search_backend.search_scored(db, model, query, model.user_id == user_id, limit=limit)
+        return [
+            SearchHit(
+                type=type_name,
+                id=row.id,
+                title=getattr(row, title_column.key),
+                snippet=make_snippet(getattr(row, body_column.key), terms),
+                score=score,
+                timestamp=getattr(row, timestamp_column.key),
+            )
+            for row, score in results
+        ]
+
+
+@router.get("", response_model=List[SearchHit], status_code=status.HTTP_200_OK)
+async def search_all(
+    q: str,
+    user: UserDep,
+    limit: Annotated[int, Query(ge=1, le=50)] = 5,
+    types: Annotated[List[SearchType] | None, Query()] = None,
+):
+    selected = [name for name in SEARCH_TYPES if not types or name in types]
+    # One session per entity type so the four searches run side by side.
+    groups = await asyncio.gather(*(search_type(name, q, user.id, limit) for name in selected))
+    hits = [hit for group in groups for hit in group]
+    hits.sort(key=lambda hit: hit.score, reverse=True)
+    return hits
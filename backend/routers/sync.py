@@ -0,0 +1,95 @@
+import base64
+import json
+from fastapi import APIRouter, HTTPException, Query, status
+from sqlalchemy import and_, or_, select
+from typing import Annotated, Optional
+from ..models import SyncResponse, ReturnTodo, ReturnDiary, ReturnNote, ReturnGoal
+from ..schemas import SyncChange
+from .auth import UserDep
+from ..db import ReadSessionDep
+from ..changes import TRACKED
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT
+from ..serialization import build_rows
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"],
+)
+
+RESPONSE_MODELS = {"todos": ReturnTodo, "diaries": ReturnDiary, "notes": ReturnNote, "goals": ReturnGoal}
+
+# Position (version, id) per entity type; before everything for a full sync.
+START = (-1, 0)
+
+
+def encode_sync_cursor(positions: dict[str, tuple[int, int]]) -> str:
+    raw = json.dumps({entity: list(position) for entity, position in positions.items()}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: Optional[str]) -> dict[str, tuple[int, int]]:
+    if not cursor:
+        return {entity: START for entity in TRACKED}
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        positions = json.loads(base64.urlsafe_b64decode(padded))
+        return {entity: (int(positions[entity][0]), int(positions[entity][1])) for entity in TRACKED}
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def after(version_column, id_column, position: tuple[int, int]):
+    """(version, id) comes after `position`."""
+    since, last_id = position
+    return or_(version_column > since, and_(version_column == since, id_column > last_id))
+
+
+async def entity_changes(db, user_id: int, entity: str, position: tuple[int, int], limit: int):
+    """Up to `limit` changes to `entity` after `position`, in (version, id)
+    order: the changes dict, the new position and whether more are left."""
+    model, response_model = TRACKED[entity], RESPONSE_MODELS[entity]
+    names = list(response_model.model_fields)
+    columns = [getattr(model, name) for name in names if name in model.__table__.columns]
+    rows = (await db.execute(
+        select(SyncChange.entity_id, SyncChange.version, SyncChange.created_version, SyncChange.deleted, *columns)
+        .outerjoin(model, (model.id == SyncChange.entity_id) & (model.user_id == SyncChange.user_id))
+        .where(
+            (SyncChange.user_id == user_id) & (SyncChange.entity == entity),
+            after(SyncChange.version, SyncChange.entity_id, position),
+            # Entities created and deleted since the cursor never reached the client.
+            ~(SyncChange.deleted & after(SyncChange.created_version, SyncChange.entity_id, position)),
+        )
+        .order_by(SyncChange.version, SyncChange.entity_id)
+        .limit(limit + 1)
+    )).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    live = [row for row in rows if not row.deleted and row.id is not None]
+    built = {row["id"]: row for row in await build_rows(db, model, response_model, live, names)}
+    changes = {"created": [], "updated": [], "deleted": []}
+    for row in rows:
+        if row.entity_id not in built:
+            changes["deleted"].append(row.entity_id)
+        elif (row.created_version, row.entity_id) > position:
+            # Created after the cursor (a page may end inside one version).
+            changes["created"].append(built[row.entity_id])
+        else:
+            changes["updated"].append(built[row.entity_id])
+    if rows:
+        position = (rows[-1].version, rows[-1].entity_id)
+    return changes, position, has_more
+
+
+@router.get("", response_model=SyncResponse, status_code=status.HTTP_200_OK)
+async def sync(db : ReadSessionDep, user : UserDep,
+        since : Optional[str] = None,
+        limit : Annotated[int, Query(ge=1, le=MAX_LIMIT)] = DEFAULT_LIMIT):
+    positions = decode_sync_cursor(since)
+    response = {"has_more": False}
+    for entity in TRACKED:
+        changes, positions[entity], has_more = await entity_changes(db, user.id, entity, positions[entity], limit)
+        response[entity] = changes
+        response["has_more"] |= has_more
+    response["cursor"] = encode_sync_cursor(positions)
+    return response
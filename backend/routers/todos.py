@@ -1,16 +1,24 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import func
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from typing import Annotated, List
 from ..models import (
     AddTodo,
     ReturnTodo,
     UpdateTodo,
-    UpdateStatus
+    UpdateStatus,
+    TodoBatch,
+    BatchResult,
 )
 from ..schemas import Todo 
 from datetime import datetime, date, timezone, timedelta
 from .auth import UserDep
-from ..db import SessionDep
+from ..db import ReadSessionDep, SessionDep
+from ..dates import on_day
+from ..pagination import PageDep, paginate, MAX_LIMIT
+from ..search import search_backend
+from ..batch import run_batch
+from ..rollover import roll_over_if_due, roll_over_user
+from ..versions import TodosVersion, bump_version, check_not_modified, etag_headers
  
 router = APIRouter(
     prefix="/todos",
@@ -19,46 +27,31 @@ router = APIRouter(
 
 
 @router.get("/search", response_model=List[ReturnTodo],status_code=status.HTTP_200_OK)
-async def search_Todo(query : str , db : SessionDep, user_model : UserDep):
-    search = f"%{query}%"
-    results = db.query(Todo).filter(((Todo.title.ilike(search)) | (Todo.description.ilike(search))) & (Todo.user_id == user_model.id)).all() 
-    if not results:
-        return []
-    else:
-        return results 
+async def search_Todo(query : str , db : ReadSessionDep, user_model : UserDep,
+        limit : Annotated[int, Query(ge=1, le=MAX_LIMIT)] = 50):
+    return await search_backend.search(db, Todo, query, Todo.user_id == user_model.id, limit=limit) 
 
 
 @router.get('/',status_code=status.HTTP_200_OK,response_model=List[ReturnTodo])
-async def get_todos(db : SessionDep, user:UserDep):
-    todos = db.query(Todo).filter(Todo.user_id == user.id).all() 
-    return todos 
+async def get_todos(db : ReadSessionDep, user:UserDep, page : PageDep, etag : TodosVersion):
+    query = select(Todo).where(Todo.user_id == user.id)
+    return await paginate(db, query, page, Todo, ReturnTodo, Todo.entry_datetime, headers=etag_headers(etag))
     
 
 
 
 @router.get('/date/{entry_date}',response_model=List[ReturnTodo],status_code=status.HTTP_200_OK)
-async def get_todoby_date(entry_date: date, db:SessionDep,user : UserDep):
+async def get_todoby_date(entry_date: date, db:SessionDep,user : UserDep, request : Request, response : Response):
     today = date.today()
-    if entry_date == today and user.rollover:
-        incomplete_todos = db.query(Todo).filter(
-            (func.date(Todo.entry_datetime) < today) &
-            (Todo.user_id == user.id) &
-            (Todo.status == False)
-        ).all()
-
-        if incomplete_todos:
-             
-            for todo in incomplete_todos:
-                original_time = todo.entry_datetime.time()
-                todo.entry_datetime = datetime.combine(today, original_time)
-                todo.edited = True
-                todo.edited_datetime = datetime.now(timezone.utc)
-            db.commit()
-    todos = db.query(Todo).filter((func.date(Todo.entry_datetime) == entry_date) & (Todo.user_id == user.id)).all() 
+    if entry_date == today:
+        await roll_over_if_due(db, user, today)
+    # Checked after the rollover, which may change today's todos.
+    await check_not_modified(request, response, db, user.id, "todos")
+    todos = (await db.scalars(select(Todo).where(on_day(Todo.entry_datetime, entry_date) & (Todo.user_id == user.id)))).all() 
     return todos
 @router.get('/{id}',status_code=status.HTTP_200_OK,response_model=ReturnTodo)
-async def gettodobyid(id: int , db : SessionDep, user : UserDep):
-    todo = db.query(Todo).filter((Todo.id== id) & (Todo.user_id == user.id)).first()
+async def gettodobyid(id: int , db : ReadSessionDep, user : UserDep, etag : TodosVersion):
+    todo = await db.scalar(select(Todo).where((Todo.id== id) & (Todo.user_id == user.id)))
     if not todo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Todos FOund")
     else:
@@ -66,43 +59,70 @@ async def gettodobyid(id: int , db : SessionDep, user : UserDep):
  
 
  
-@router.post("/",status_code=status.HTTP_201_CREATED,response_model=ReturnTodo)
-async def addTodo(todo : AddTodo, db : SessionDep, user : UserDep):
- 
+def new_todo_values(todo : AddTodo, user_id : int) -> dict:
     entry_dt = datetime.now()
     
  
     if hasattr(todo, 'date') and todo.date:
         entry_dt = datetime.combine(todo.date, datetime.now().time())
 
-    db_todo = Todo(
+    return dict(
         title=todo.title,
         description = todo.description,
         priority=todo.priority,
         edited = False,
-        user_id = user.id,
+        user_id = user_id,
         entry_datetime = entry_dt
     )
+
+
+def new_todo(todo : AddTodo, user_id : int) -> Todo:
+    return Todo(**new_todo_values(todo, user_id))
+
+
+def status_values(done : bool, now : datetime) -> dict:
+    return {
+        "status": done,
+        "edited": True,
+        "edited_datetime": now,
+        "completed_datetime": now if done else None,
+    }
+
+
+@router.post("/batch",status_code=status.HTTP_200_OK,response_model=List[BatchResult])
+async def batch_todos(batch : TodoBatch, db : SessionDep, user : UserDep):
+    def create_rows(items):
+        return [new_todo_values(item, user.id) for item in items]
+
+    return await run_batch(db, Todo, user.id, batch.operations, create_rows, status_values)
+
+
+@router.post("/",status_code=status.HTTP_201_CREATED,response_model=ReturnTodo)
+async def addTodo(todo : AddTodo, db : SessionDep, user : UserDep):
+    db_todo = new_todo(todo, user.id)
     db.add(db_todo)
-    db.commit() 
-    db.refresh(db_todo)
+    await db.flush()
+    await bump_version(db, user.id, "todos", created=[db_todo.id])
+    await db.commit() 
+    await db.refresh(db_todo)
     return db_todo
  
 
 @router.delete("/{id}",status_code=status.HTTP_200_OK)
 async def delete_todo(id : int , db : SessionDep, user:UserDep):
-    todo = db.query(Todo).filter((Todo.id == id) & (Todo.user_id == user.id)).first() 
+    todo = await db.scalar(select(Todo).where((Todo.id == id) & (Todo.user_id == user.id))) 
     if not todo : 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="ID NOT FOUND")
     else : 
-        db.delete(todo) ; 
-        db.commit() 
+        await db.delete(todo) ; 
+        await bump_version(db, user.id, "todos", deleted=[id])
+        await db.commit() 
         return {"detail": f"Todo with id {id} deleted"}
 
 
 @router.put("/{id}/status",status_code=status.HTTP_200_OK,response_model=ReturnTodo)
 async def update_status(id:int, todo:UpdateStatus,  db:SessionDep, user : UserDep):
-    db_todo = db.query(Todo).filter((Todo.id == id) & (Todo.user_id == user.id)).first() 
+    db_todo = await db.scalar(select(Todo).where((Todo.id == id) & (Todo.user_id == user.id))) 
     if not db_todo : 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="ID NOT FOUND")
     else : 
@@ -114,14 +134,15 @@ async def update_status(id:int, todo:UpdateStatus,  db:SessionDep, user : UserDe
             db_todo.completed_datetime = now
         else:
             db_todo.completed_datetime = None 
-        db.commit() 
-        db.refresh(db_todo)
+        await bump_version(db, user.id, "todos", updated=[id])
+        await db.commit() 
+        await db.refresh(db_todo)
         return db_todo
           
     
 @router.put("/{id}",status_code=status.HTTP_200_OK,response_model=ReturnTodo)
 async def update_todo(id:int, todo:UpdateTodo,  db:SessionDep, user : UserDep):
-    db_todo = db.query(Todo).filter((Todo.id == id) & (Todo.user_id == user.id)).first() 
+    db_todo = await db.scalar(select(Todo).where((Todo.id == id) & (Todo.user_id == user.id))) 
     if not db_todo : 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="ID NOT FOUND")
     else : 
@@ -130,23 +151,11 @@ async def update_todo(id:int, todo:UpdateTodo,  db:SessionDep, user : UserDep):
         db_todo.edited = True 
         db_todo.priority = todo.priority
         db_todo.edited_datetime = datetime.now(timezone.utc) 
-        db.commit() 
-        db.refresh(db_todo)
+        await bump_version(db, user.id, "todos", updated=[id])
+        await db.commit() 
+        await db.refresh(db_todo)
         return db_todo  
 
 @router.post("/rollover",response_model=List[ReturnTodo],status_code=status.HTTP_200_OK)
 async def rollover_todos(db : SessionDep, user : UserDep):
-    today = date.today()
-    
-    todos = db.query(Todo).filter(
-        (func.date(Todo.entry_datetime) < today) & (Todo.user_id == user.id) & (Todo.status == False)).all() 
-    for todo in todos:
-        original_time = todo.entry_datetime.time()
-        todo.entry_datetime = datetime.combine(today, original_time)
-        todo.edited = True
-        todo.edited_datetime = datetime.now(timezone.utc)
-    db.commit()
-    for todo in todos:
-        db.refresh(todo)
-    return todos
-
+    return await roll_over_user(db, user, date.today())
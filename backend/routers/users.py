@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
-from ..email_utils import send_otp_email
+from sqlalchemy import delete, select
+from ..email_utils import otp_email
+from ..outbox import enqueue, outbox_worker
 from ..models import (
     ReturnUser,
     UpdateEmail,
@@ -8,9 +10,10 @@ from ..models import (
     UpdateRollover,
     ValidateEmail,
 )
-from ..schemas import User
+from ..schemas import User, Todo, Diary, Note, Goal, note_tags, EntityVersion, SyncChange
 from .auth import UserDep, get_password_hash
 from ..db import SessionDep
+from ..principal_cache import principal_cache
 import random 
 
 router = APIRouter(
@@ -20,23 +23,25 @@ router = APIRouter(
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=ReturnUser)
 async def getme(user: UserDep, db: SessionDep):
-    db.refresh(user)
+    await db.refresh(user)
     return user
 
 @router.put("/username", status_code=status.HTTP_200_OK, response_model=ReturnUser)
 async def change_username(user: UserDep, db: SessionDep, user_model: UpdateUsername):
     user.username = user_model.username
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
 
 @router.put("/password", status_code=status.HTTP_200_OK, response_model=ReturnUser)
 async def change_password(user: UserDep, db: SessionDep, user_model: UpdatePassword):
-    user.hashed_password = get_password_hash(password=user_model.password)
+    user.hashed_password = await get_password_hash(password=user_model.password)
     user.email_validated = False
     user.notifications_enabled = False
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
 
 @router.put("/email", status_code=status.HTTP_200_OK, response_model=ReturnUser)
@@ -44,21 +49,32 @@ async def change_email(user: UserDep, db: SessionDep, user_model: UpdateEmail):
     user.email = user_model.email
     user.email_validated = False
     user.notifications_enabled = False
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
 
 @router.put("/rollover", status_code=status.HTTP_200_OK, response_model=ReturnUser)
 async def change_rollover_settings(user: UserDep, db: SessionDep, user_model: UpdateRollover):
     user.rollover = user_model.rollover
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user: UserDep, db: SessionDep):
-    db.delete(user)
-    db.commit()
+    # Remove the account's rows with set-based deletes; letting the ORM cascade
+    # would lazy load every collection only to null out non-nullable user_ids.
+    user_notes = select(Note.id).where(Note.user_id == user.id)
+    await db.execute(delete(note_tags).where(note_tags.c.note_id.in_(user_notes)))
+    for model in (Todo, Diary, Note, Goal):
+        await db.execute(delete(model).where(model.user_id == user.id))
+    await db.execute(delete(EntityVersion).where(EntityVersion.user_id == user.id))
+    await db.execute(delete(SyncChange).where(SyncChange.user_id == user.id))
+    await db.delete(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
 
 
 @router.post("/send-validation-code", status_code=status.HTTP_200_OK)
@@ -66,25 +82,28 @@ async def send_validation_code(user: UserDep, db: SessionDep):
     otp = str(random.randint(100000, 999999))
 
     user.verification_code = otp
-    db.commit()
-    
-    try:
-        await send_otp_email(user.email, otp)
-        return {"detail": f"Verification code sent to {user.email}"}
-    except Exception as e:
-        print(f"❌ Email Error: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
+    # Queued in the same transaction as the code; the outbox worker delivers
+    # it (with retries) so the request never waits on the email provider.
+    await enqueue(db, [otp_email(user.email, otp)], kind="otp")
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    outbox_worker.notify()
+    return {"detail": f"Verification code sent to {user.email}"}
 
 @router.post("/validate-email", status_code=status.HTTP_200_OK)
 async def validate_email(user: UserDep, db: SessionDep, data: ValidateEmail):
+    # The code may have been issued by another worker after this principal
+    # was cached there.
+    await db.refresh(user)
 
     print(f"DEBUG: Validating {user.email}. DB Code: {user.verification_code}, Input: {data.code}")
     
     if user.verification_code == data.code:
         user.email_validated = True
         user.verification_code = None
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        principal_cache.invalidate(user.id)
+        await db.refresh(user)
         print("DEBUG: Validation Success! email_validated is now True")
         return {"detail": "Email validated successfully."}
     else:
@@ -94,7 +113,7 @@ async def validate_email(user: UserDep, db: SessionDep, data: ValidateEmail):
 
 @router.put("/notifications", status_code=status.HTTP_200_OK, response_model=ReturnUser)
 async def change_notification_settings(user: UserDep, db: SessionDep, enable: bool):
-    db.refresh(user)
+    await db.refresh(user)
     
     print(f"DEBUG: Setting Notifications. Enable: {enable}, Validated: {user.email_validated}")
 
@@ -105,13 +124,15 @@ async def change_notification_settings(user: UserDep, db: SessionDep, enable: bo
     else:
         user.notifications_enabled = False
         
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
 
 @router.put("/notifications/disable", status_code=status.HTTP_200_OK, response_model=ReturnUser)
 async def disable_notifications(user: UserDep, db: SessionDep):
     user.notifications_enabled = False
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
\ No newline at end of file
@@ -1,35 +1,72 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime
+import os
+from datetime import date, datetime
+from tzlocal import get_localzone
+from sqlalchemy import func, select
 from .schemas import User, Todo 
-from .email_utils import send_reminder_email 
-from .db import SessionLocal
+from .email_utils import reminder_email
+from .outbox import enqueue, outbox_worker
+from .rollover import roll_over_all_users
+from .db import SessionLocal, engine
+from .leader import SchedulerLeader, leader_lock
+
+REMINDER_CHUNK_SIZE = int(os.getenv("REMINDER_CHUNK_SIZE", "500"))
+
+
+def pending_reminders_query():
+    # One grouped query instead of a COUNT per user; users without pending
+    # todos drop out of the inner join.
+    return (
+        select(User.email, User.username, func.count(Todo.id))
+        .join(Todo, Todo.user_id == User.id)
+        .where((User.notifications_enabled == True) & (Todo.status == False))
+        .group_by(User.id, User.email, User.username)
+    )
+
 
 async def send_daily_reminders():
     print(f"⏰ Scheduler Triggered at {datetime.now()} (Server Time)")  
-    db = SessionLocal()
-    try:
-        users = db.query(User).filter(User.notifications_enabled == True).all()
-        print(f"🔎 Found {len(users)} users with notifications enabled.") 
-        
-        for user in users:
-            pending_count = db.query(Todo).filter((Todo.user_id == user.id) & (Todo.status == False)).count()
-            
-            if pending_count > 0:
-                print(f"🚀 Sending reminder to {user.email} ({pending_count} tasks)")
-                await send_reminder_email(user.email, user.username, pending_count)
-            else:
-                print(f"💤 No pending tasks for {user.email}, skipping.")
-                
-    except Exception as e:
-        print(f"❌ Error sending reminders: {e}")
-    finally:
-        db.close()
+    queued = 0
+
+    # Reminders are queued chunk by chunk as the grouped query streams in; the
+    # outbox worker batches, rate-limits and retries the actual delivery.
+    # The outbox rows are written through a second session: some drivers
+    # cannot run another statement while a server-side cursor is open.
+    async with SessionLocal() as db, SessionLocal() as outbox_db:
+        try:
+            result = await db.stream(pending_reminders_query().execution_options(yield_per=REMINDER_CHUNK_SIZE))
+            async for chunk in result.partitions():
+                messages = [reminder_email(email, username, count) for email, username, count in chunk]
+                await enqueue(outbox_db, messages, kind="reminder")
+                queued += len(messages)
+            await outbox_db.commit()
+        except Exception as e:
+            print(f"❌ Error queuing reminders: {e}")
+            return
+
+    outbox_worker.notify()
+    print(f"📬 Reminders queued: {queued}")
+
+async def pre_roll_todos():
+    # Rolls everyone over just after midnight so that reading today's todos
+    # doesn't have to write.
+    async with SessionLocal() as db:
+        try:
+            moved = await roll_over_all_users(db, date.today())
+            print(f"🌙 Rolled over {moved} todos")
+        except Exception as e:
+            print(f"❌ Error rolling over todos: {e}")
 
 scheduler = AsyncIOScheduler(timezone='Asia/Kolkata')
 
  
 scheduler.add_job(send_daily_reminders, 'cron', hour=8, minute=00)
 scheduler.add_job(send_daily_reminders, 'cron', hour=18, minute=00)
+# Rollover compares against the server's date, so it runs at server midnight.
+scheduler.add_job(pre_roll_todos, 'cron', hour=0, minute=0, timezone=get_localzone())
+
+# Every worker process runs the app, but only the elected leader runs jobs.
+scheduler_leader = SchedulerLeader(scheduler, leader_lock(engine))
 
  
 # scheduler.add_job(send_daily_reminders, 'date', run_date=datetime.now())
\ No newline at end of file
@@ -1,16 +1,32 @@
 from sqlalchemy.orm import declarative_base
 from datetime import datetime, timezone
-from sqlalchemy  import Column, Integer, String, Boolean, DateTime, Text , ForeignKey, Table
+from sqlalchemy  import Column, Integer, String, Boolean, Date, DateTime, Text , ForeignKey, Table, Index, PrimaryKeyConstraint, TypeDecorator
 from sqlalchemy_utils import EmailType
 from sqlalchemy.orm import relationship, mapped_column  
 Base = declarative_base() 
 
 
+class UTCDateTime(TypeDecorator):
+    """Naive UTC timestamps. asyncpg refuses timezone-aware values for
+    `timestamp without time zone`, so aware datetimes are converted on bind."""
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
 note_tags = Table(
     'note_tags', 
     Base.metadata,
-    Column('note_id',Integer,ForeignKey('Note.id')),
-    Column('tag_id',Integer,ForeignKey('Tag.id'))
+    Column('note_id',Integer,ForeignKey('Note.id'), nullable=False),
+    Column('tag_id',Integer,ForeignKey('Tag.id'), nullable=False),
+    # tag_id first serves "notes with tag X"; the reverse index serves
+    # loading a note's tags.
+    PrimaryKeyConstraint('tag_id', 'note_id', name='pk_note_tags'),
+    Index('ix_note_tags_note_tag', 'note_id', 'tag_id'),
 )
 
 class Tag(Base):
@@ -26,14 +42,16 @@ class User(Base):
     id = Column(Integer, primary_key=True , index = True)
     username = Column(String(255) , unique=True, index=True, nullable=False)
     hashed_password = Column(String(255) , nullable=False) 
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(UTCDateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(UTCDateTime, default=lambda: datetime.now(timezone.utc))
     email = Column(EmailType, nullable=False , unique=True)
     email_validated = Column(Boolean, nullable=False, default=False)
     notifications_enabled = Column(Boolean, nullable=False, default=True)
     verification_code = Column(String(10), nullable=True)
     role = Column(String(255), nullable=False, default="User") 
     rollover = Column(Boolean, nullable=False, default=False)
+    # Day up to which overdue todos were last moved forward (server date).
+    last_rolled_over = Column(Date, nullable=True)
     todos = relationship("Todo", back_populates="user")
     diaries = relationship("Diary", back_populates="user")
     notes = relationship("Note", back_populates="user")
@@ -44,11 +62,14 @@ class Diary(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=True)
     content = Column(Text, nullable=False)
-    entry_datetime = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    entry_datetime = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     edited = Column(Boolean, nullable=False, default=False)
-    edited_datetime = Column(DateTime, nullable=True)
+    edited_datetime = Column(UTCDateTime, nullable=True)
     user_id = mapped_column(ForeignKey("User.id"), nullable=False)
     user = relationship("User", back_populates="diaries")
+    __table_args__ = (
+        Index("ix_diary_user_entry", "user_id", "entry_datetime"),
+    )
      
 
 
@@ -60,11 +81,15 @@ class Todo(Base):
     description = Column(Text, nullable=True)
     priority = Column(String(50), nullable=False)
     status = Column(Boolean, default=False) 
-    entry_datetime = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
-    edited_datetime = Column(DateTime, nullable=True)
-    completed_datetime = Column(DateTime, nullable=True)
+    entry_datetime = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    edited_datetime = Column(UTCDateTime, nullable=True)
+    completed_datetime = Column(UTCDateTime, nullable=True)
     user_id = mapped_column(ForeignKey("User.id"), nullable=False)
     user = relationship("User", back_populates="todos")
+    __table_args__ = (
+        Index("ix_todo_user_entry", "user_id", "entry_datetime"),
+        Index("ix_todo_user_completed", "user_id", "completed_datetime"),
+    )
 
 
 
@@ -76,11 +101,14 @@ class Note(Base):
     content = Column(Text, nullable=False)
     is_pinned = Column(Boolean, nullable=False,default=False)
     is_archived = Column(Boolean,nullable=False, default=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    edited_at = Column(DateTime, nullable=True)
-    tags = relationship("Tag" , secondary=note_tags,back_populates="notes")
+    created_at = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    edited_at = Column(UTCDateTime, nullable=True)
+    tags = relationship("Tag" , secondary=note_tags,back_populates="notes", lazy="selectin")
     user_id = mapped_column(ForeignKey("User.id"), nullable=False)
     user = relationship("User", back_populates="notes")
+    __table_args__ = (
+        Index("ix_note_user_created", "user_id", "created_at"),
+    )
 
 
 class Goal(Base):
@@ -89,10 +117,58 @@ class Goal(Base):
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
     is_completed = Column(Boolean, nullable=False, default=False)
-    target_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    completed_at = Column(DateTime, nullable=True)
-    updated_at = Column(DateTime, nullable=True)
+    target_date = Column(UTCDateTime, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    completed_at = Column(UTCDateTime, nullable=True)
+    updated_at = Column(UTCDateTime, nullable=True)
     user_id = mapped_column(ForeignKey("User.id"), nullable=False)
     user = relationship("User", back_populates="goals")
+    __table_args__ = (
+        Index("ix_goal_user_created", "user_id", "created_at"),
+    )
+
+
+
+class EmailOutbox(Base):
+    __tablename__ = "EmailOutbox"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    provider = Column(String(50), nullable=False)
+    recipient = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    next_attempt_at = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    claimed_until = Column(UTCDateTime, nullable=True)
+    claim_token = Column(String(36), nullable=True)
+    sent_at = Column(UTCDateTime, nullable=True)
+    __table_args__ = (
+        Index("ix_emailoutbox_status_next", "status", "next_attempt_at"),
+    )
+
+
+class EntityVersion(Base):
+    """Per-user change counter for one entity type (todos, diaries, notes,
+    goals), bumped on every write; used as the ETag of that user's views."""
+    __tablename__ = "EntityVersion"
+    user_id = mapped_column(ForeignKey("User.id"), primary_key=True)
+    entity = Column(String(20), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 
+class SyncChange(Base):
+    """Latest change to one todo, diary entry, note or goal: the user's
+    version of its entity type when it was created and last written.
+    `deleted` rows are tombstones."""
+    __tablename__ = "SyncChange"
+    user_id = mapped_column(ForeignKey("User.id"), primary_key=True)
+    entity = Column(String(20), primary_key=True)
+    entity_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False)
+    created_version = Column(Integer, nullable=False, default=0)
+    deleted = Column(Boolean, nullable=False, default=False)
+    __table_args__ = (
+        Index("ix_syncchange_user_entity_version", "user_id", "entity", "version", "entity_id"),
+    )
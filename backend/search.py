@@ -0,0 +1,184 @@
+"""Full-text search over todos, diaries, notes and goals.
+
+Each backend owns its index: a GIN expression index on Postgres, a FULLTEXT
+index on MySQL and an FTS5 table kept in sync by triggers on SQLite. The
+database maintains the index on insert/update/delete, so the routers only
+ever call `search_backend.search(...)`.
+"""
+import os
+import re
+from abc import ABC, abstractmethod
+
+from sqlalchemy import Index, case, column, func, literal_column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import engine
+from .schemas import Todo, Diary, Note, Goal
+
+SEARCH_COLUMNS = {
+    Todo: (Todo.title, Todo.description),
+    Diary: (Diary.title, Diary.content),
+    Note: (Note.title, Note.content),
+    Goal: (Goal.title, Goal.description),
+}
+
+
+def search_terms(query: str) -> list[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+def make_snippet(body: str | None, terms: list[str], width: int = 160) -> str:
+    """Up to `width` characters of `body` around the first matching term."""
+    if not body:
+        return ""
+    lowered = body.lower()
+    positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    start = max(min(positions, default=0) - width // 4, 0)
+    snippet = " ".join(body[start:start + width].split())
+    if start > 0:
+        snippet = "…" + snippet
+    if start + width < len(body):
+        snippet += "…"
+    return snippet
+
+
+class SearchBackend(ABC):
+    """Matches every term (as a prefix) and scores rows, higher is better."""
+
+    name = "base"
+
+    def install(self, connection) -> None:
+        pass
+
+    @abstractmethod
+    def scored_query(self, model, terms: list[str]):
+        """select(model, score) matching every term, best first."""
+
+    async def search_scored(self, db: AsyncSession, model, query: str, *criteria, limit: int | None = None):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        statement = self.scored_query(model, terms).where(*criteria)
+        if limit is not None:
+            statement = statement.limit(limit)
+        results = await db.execute(statement)
+        return [(row, float(score or 0)) for row, score in results.all()]
+
+    async def search(self, db: AsyncSession, model, query: str, *criteria, limit: int | None = None):
+        return [row for row, _ in await self.search_scored(db, model, query, *criteria, limit=limit)]
+
+
+class LikeBackend(SearchBackend):
+    """Fallback for databases without a full-text engine; no index is used."""
+
+    name = "like"
+
+    def scored_query(self, model, terms):
+        first, second = SEARCH_COLUMNS[model]
+        criteria = [first.ilike(f"%{term}%") | second.ilike(f"%{term}%") for term in terms]
+        score = case((first.ilike(f"%{terms[0]}%"), 1.0), else_=0.5)
+        return select(model, score).where(*criteria).order_by(score.desc(), model.id.desc())
+
+
+class PostgresBackend(SearchBackend):
+    name = "postgresql"
+
+    def document(self, model):
+        # Spelled with inline literals only, so the statement text matches the
+        # index expression whatever the driver does with bound parameters.
+        first, second = SEARCH_COLUMNS[model]
+        empty = text("''")
+        return func.to_tsvector(
+            text("'english'"),
+            func.coalesce(first, empty).op("||")(text("' '")).op("||")(func.coalesce(second, empty)),
+        )
+
+    def install(self, connection):
+        for model in SEARCH_COLUMNS:
+            index = Index(f"ix_{model.__tablename__.lower()}_fts", self.document(model), postgresql_using="gin")
+            index.create(connection, checkfirst=True)
+
+    def scored_query(self, model, terms):
+        document = self.document(model)
+        tsquery = func.to_tsquery(text("'english'"), " & ".join(f"{term}:*" for term in terms))
+        score = func.ts_rank(document, tsquery)
+        return select(model, score).where(document.op("@@")(tsquery)).order_by(score.desc(), model.id.desc())
+
+
+class MySQLBackend(SearchBackend):
+    name = "mysql"
+
+    def install(self, connection):
+        for model, (first, second) in SEARCH_COLUMNS.items():
+            index = Index(f"ix_{model.__tablename__.lower()}_fts", first, second, mysql_prefix="FULLTEXT")
+            index.create(connection, checkfirst=True)
+
+    def scored_query(self, model, terms):
+        from sqlalchemy.dialects.mysql import match
+
+        first, second = SEARCH_COLUMNS[model]
+        score = match(first, second, against=" ".join(f"+{term}*" for term in terms)).in_boolean_mode()
+        return select(model, score).where(score).order_by(score.desc(), model.id.desc())
+
+
+class SQLiteBackend(SearchBackend):
+    """FTS5 external-content tables named `<table>_fts`, synced by triggers."""
+
+    name = "sqlite"
+
+    def fts_name(self, model) -> str:
+        return f"{model.__tablename__}_fts"
+
+    def install(self, connection):
+        for model, (first, second) in SEARCH_COLUMNS.items():
+            fts = self.fts_name(model)
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).first()
+            if exists:
+                continue
+            source, a, b = model.__tablename__, first.key, second.key
+            old_row = f"'delete', old.id, old.{a}, old.{b}"
+            new_row = f"new.id, new.{a}, new.{b}"
+            for statement in (
+                f'CREATE VIRTUAL TABLE "{fts}" USING fts5({a}, {b}, content=\'{source}\', content_rowid=\'id\')',
+                f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{source}" BEGIN '
+                f'INSERT INTO "{fts}"(rowid, {a}, {b}) VALUES ({new_row}); END',
+                f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{source}" BEGIN '
+                f'INSERT INTO "{fts}"("{fts}", rowid, {a}, {b}) VALUES ({old_row}); END',
+                f'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF {a}, {b} ON "{source}" BEGIN '
+                f'INSERT INTO "{fts}"("{fts}", rowid, {a}, {b}) VALUES ({old_row}); '
+                f'INSERT INTO "{fts}"(rowid, {a}, {b}) VALUES ({new_row}); END',
+                f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')',
+            ):
+                connection.exec_driver_sql(statement)
+
+    def scored_query(self, model, terms):
+        fts = self.fts_name(model)
+        fts_table = table(fts, column("rowid"))
+        fts_ref = literal_column(f'"{fts}"')
+        rank = func.bm25(fts_ref)
+        return (
+            select(model, -rank)
+            .join(fts_table, fts_table.c.rowid == model.id)
+            .where(fts_ref.op("MATCH")(" ".join(f'"{term}"*' for term in terms)))
+            .order_by(rank, model.id.desc())
+        )
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (LikeBackend, PostgresBackend, MySQLBackend, SQLiteBackend)
+}
+
+
+def get_search_backend(name: str) -> SearchBackend:
+    return BACKENDS.get(name, LikeBackend)()
+
+
+search_backend = get_search_backend(os.getenv("SEARCH_BACKEND", engine.dialect.name))
+
+
+async def install_search_indexes() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(search_backend.install)
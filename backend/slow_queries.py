@@ -0,0 +1,207 @@
+"""Slow-query log for the database engine.
+
+Statements slower than SLOW_QUERY_MS are printed with the route that issued
+them and their parameters in normalized form (strings reduced to their
+length, so note bodies and emails stay out of the log), optionally with the
+database's plan for them (SLOW_QUERY_EXPLAIN). The plan is asked for in a
+background task on a separate pooled connection, never on the connection
+that ran the statement: that one may still be streaming results from a
+server-side cursor, and on Postgres a failed EXPLAIN would abort its
+transaction. Every slow statement is also
+aggregated by its normalized text (whitespace and placeholder lists such as
+`IN (?, ?, ?)` collapsed) into a top-N report by total time, served on
+/metrics/slow-queries (behind METRICS_TOKEN) and printed at shutdown.
+
+SLOW_QUERY_MS=0 logs every statement; -1 turns the log off.
+"""
+import asyncio
+import contextvars
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .instrumentation import current_request
+from .metrics import Counter
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_TOP = int(os.getenv("SLOW_QUERY_TOP", "20"))
+
+slow_statements = Counter("lumina_db_slow_statements_total", "SQL statements slower than SLOW_QUERY_MS")
+
+EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN ", "mysql": "EXPLAIN "}
+EXPLAINABLE = ("select", "with", "update", "delete")
+
+WHITESPACE = re.compile(r"\s+")
+PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+IN_LIST = re.compile(rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})+\s*\)")
+
+
+def normalize_statement(statement: str) -> str:
+    return IN_LIST.sub("(...)", WHITESPACE.sub(" ", statement).strip())
+
+
+def normalize_value(value):
+    if isinstance(value, str):
+        return f"<str:{len(value)}>"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def normalize_parameters(parameters, executemany: bool):
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "first": normalize_parameters(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: normalize_value(value) for key, value in parameters.items()}
+    return normalize_value(list(parameters or ()))
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    routes: set[str] = field(default_factory=set)
+    plan: list[str] | None = None
+    explaining: bool = False
+
+    def as_dict(self) -> dict:
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds / self.count * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "routes": sorted(self.routes),
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog:
+    """Engine event hooks timing statements and recording the slow ones."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain: bool = SLOW_QUERY_EXPLAIN):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.queries: dict[str, SlowQuery] = {}
+        self._lock = threading.Lock()
+        self._engines: dict[Engine, AsyncEngine] = {}
+        self._plan_tasks: set[asyncio.Task] = set()
+
+    def install(self, engine: AsyncEngine) -> None:
+        if self.threshold < 0:
+            return
+        sync_engine = engine.sync_engine
+        self._engines[sync_engine] = engine
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(sync_engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        started = exception_context.connection.info.get("slow_query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["slow_query_started"].pop()
+        if elapsed < self.threshold:
+            return
+        stats = current_request.get()
+        route = stats.route if stats is not None else "background"
+        key = normalize_statement(statement)
+        with self._lock:
+            entry = self.queries.setdefault(key, SlowQuery(key))
+            entry.count += 1
+            entry.total_seconds += elapsed
+            entry.max_seconds = max(entry.max_seconds, elapsed)
+            entry.routes.add(route)
+            needs_plan = self.explain and entry.plan is None and not entry.explaining and not executemany
+            if needs_plan:
+                entry.explaining = True
+        slow_statements.inc(route=route)
+        print(
+            f"🐢 Slow query {elapsed * 1000:.0f} ms [{route}] {key[:500]} "
+            f"params={normalize_parameters(parameters, executemany)}"
+        )
+        if needs_plan:
+            self._schedule_plan(conn.engine, entry, statement, parameters)
+
+    def _schedule_plan(self, sync_engine: Engine, entry: SlowQuery, statement: str, parameters) -> None:
+        engine = self._engines.get(sync_engine)
+        prefix = EXPLAIN_PREFIX.get(sync_engine.dialect.name)
+        if engine is None or prefix is None or not statement.lstrip().lower().startswith(EXPLAINABLE):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        parameters = dict(parameters) if isinstance(parameters, dict) else tuple(parameters or ())
+        # A fresh context, so the EXPLAIN is not counted against the request.
+        task = loop.create_task(
+            self._capture_plan(engine, entry, prefix + statement, parameters), context=contextvars.Context()
+        )
+        self._plan_tasks.add(task)
+        task.add_done_callback(self._plan_tasks.discard)
+
+    async def _capture_plan(self, engine: AsyncEngine, entry: SlowQuery, statement: str, parameters) -> None:
+        def explain(connection) -> list[str]:
+            # Raw DBAPI cursor: the EXPLAIN does not go through the engine's
+            # events, so it is neither timed nor counted.
+            cursor = connection.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(statement, parameters)
+                return [" | ".join(str(value) for value in row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+        try:
+            async with engine.connect() as connection:
+                plan = await connection.run_sync(explain)
+                await connection.rollback()
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        entry.plan = plan
+        entry.explaining = False
+        print(f"   plan for {entry.statement[:200]}:\n         " + "\n         ".join(plan))
+
+    async def aclose(self) -> None:
+        """Cancel plans still being captured (before the engines are disposed)."""
+        for task in list(self._plan_tasks):
+            task.cancel()
+        await asyncio.gather(*self._plan_tasks, return_exceptions=True)
+
+    def report(self, top: int = SLOW_QUERY_TOP) -> list[dict]:
+        """The `top` slow statements by total time."""
+        with self._lock:
+            entries = sorted(self.queries.values(), key=lambda entry: entry.total_seconds, reverse=True)[:top]
+            return [entry.as_dict() for entry in entries]
+
+    def print_report(self, top: int = SLOW_QUERY_TOP) -> None:
+        entries = self.report(top)
+        if not entries:
+            return
+        print(f"🐢 Top {len(entries)} slow statements by total time:")
+        for entry in entries:
+            print(
+                f"   {entry['total_ms']:>10.0f} ms total  {entry['count']:>6}x  max {entry['max_ms']:.0f} ms  "
+                f"{', '.join(entry['routes'])}  {entry['statement'][:200]}"
+            )
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,133 @@
+"""Bulk tag resolution for note writes.
+
+`resolve_tags` turns a list of tag names into Tag rows with a constant number
+of queries: names already in the in-process name→id cache cost nothing, the
+rest are looked up with one IN query, and any still missing are created with
+one INSERT that ignores conflicts (so concurrent creates of the same new tag
+don't fail on the unique constraint) followed by one IN query for their ids.
+
+Tags are never renamed or deleted, but a tag created by a transaction that
+is rolled back disappears again, so the ids of tags created in a session are
+kept in its `info` and only move into the cache once the session commits.
+"""
+import os
+from collections import OrderedDict
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .db import insert_ignoring_conflicts
+from .schemas import Tag, note_tags
+
+TAG_CACHE_SIZE = int(os.getenv("TAG_CACHE_SIZE", "10000"))
+
+
+class TagCache:
+    """LRU map of tag name to id."""
+
+    def __init__(self, maxsize: int = TAG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._ids: OrderedDict[str, int] = OrderedDict()
+
+    def get(self, name: str) -> int | None:
+        tag_id = self._ids.get(name)
+        if tag_id is not None:
+            self._ids.move_to_end(name)
+        return tag_id
+
+    def put(self, name: str, tag_id: int) -> None:
+        if self.maxsize <= 0:
+            return
+        self._ids[name] = tag_id
+        self._ids.move_to_end(name)
+        while len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+
+tag_cache = TagCache()
+
+# Session.info key for {name: id} of tags created in the open transaction.
+PENDING_TAGS = "pending_tag_ids"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_tags(session: Session) -> None:
+    for name, tag_id in session.info.pop(PENDING_TAGS, {}).items():
+        tag_cache.put(name, tag_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_uncommitted_tags(session: Session) -> None:
+    session.info.pop(PENDING_TAGS, None)
+
+
+def clean_tag_names(names: list[str]) -> list[str]:
+    """Lower-cased, stripped, de-duplicated names in their original order."""
+    cleaned = (name.strip().lower() for name in names)
+    return list(dict.fromkeys(name for name in cleaned if name))
+
+
+async def lookup_tag_ids(db: AsyncSession, names: list[str]) -> dict[str, int]:
+    """Map the (already cleaned) names that exist to their tag ids."""
+    pending = db.info.get(PENDING_TAGS, {})
+    ids = {}
+    for name in names:
+        tag_id = pending.get(name) or tag_cache.get(name)
+        if tag_id is not None:
+            ids[name] = tag_id
+
+    missing = [name for name in names if name not in ids]
+    if missing:
+        found = await db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing)))
+        for name, tag_id in found.tuples():
+            ids[name] = tag_id
+            tag_cache.put(name, tag_id)
+    return ids
+
+
+async def resolve_tag_ids(db: AsyncSession, names: list[str]) -> dict[str, int]:
+    """Map each (already cleaned) name to its tag id, creating missing tags."""
+    ids = await lookup_tag_ids(db, names)
+    missing = [name for name in names if name not in ids]
+    if missing:
+        await db.execute(insert_ignoring_conflicts(Tag.__table__), [{"name": name} for name in missing])
+        created = dict((await db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing)))).tuples().all())
+        # Cached once the caller commits (see _cache_committed_tags).
+        db.info.setdefault(PENDING_TAGS, {}).update(created)
+        ids.update(created)
+    return ids
+
+
+async def link_note_tags(db: AsyncSession, note_ids: list[int], name_lists: list[list[str]]) -> None:
+    """Tag each of `note_ids` with the names at the same position: one
+    resolution for every name, then one INSERT for all the links."""
+    name_lists = [clean_tag_names(names) for names in name_lists]
+    ids = await resolve_tag_ids(db, list(dict.fromkeys(name for names in name_lists for name in names)))
+    links = [
+        {"note_id": note_id, "tag_id": ids[name]}
+        for note_id, names in zip(note_ids, name_lists)
+        for name in names
+    ]
+    if links:
+        await db.execute(insert(note_tags), links)
+
+
+async def resolve_tag_lists(db: AsyncSession, name_lists: list[list[str]]) -> list[list[Tag]]:
+    """`resolve_tags` for several notes at once, with one resolution for all names."""
+    name_lists = [clean_tag_names(names) for names in name_lists]
+    ids = await resolve_tag_ids(db, list(dict.fromkeys(name for names in name_lists for name in names)))
+    tags = {}
+    for name, tag_id in ids.items():
+        tag = Tag(id=tag_id, name=name)
+        make_transient_to_detached(tag)
+        tags[name] = await db.merge(tag, load=False)
+    return [[tags[name] for name in names] for names in name_lists]
+
+
+async def resolve_tags(db: AsyncSession, names: list[str]) -> list[Tag]:
+    """Tag instances attached to `db` for `names`, in order, without loading them."""
+    return (await resolve_tag_lists(db, [names]))[0]
@@ -0,0 +1,112 @@
+"""Per-user change versions and conditional GETs.
+
+Every write to a user's todos, diaries, notes or goals bumps that user's
+counter for the entity in the same transaction. GET views carry the counter
+as a weak ETag; a request whose If-None-Match still matches gets a 304 after
+a single primary-key lookup, before the view's own query runs. The ids a
+write touched are stamped with the new counter for delta sync (changes.py).
+"""
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .changes import TRACKED, record_changes
+from .db import ReadSessionDep, insert_ignoring_conflicts
+from .routers.auth import UserDep
+from .schemas import EntityVersion
+
+ENTITIES = {model: entity for entity, model in TRACKED.items()}
+
+# Lets browsers keep the response but revalidate it on every use.
+CACHE_CONTROL = "private, no-cache"
+
+
+async def bump_version(db: AsyncSession, user_id: int, entity: str,
+                       created=(), updated=(), deleted=()) -> None:
+    """Increment `user_id`'s version of `entity` and record the ids of the
+    `created`, `updated` and `deleted` rows under it; the caller commits."""
+    criteria = (EntityVersion.user_id == user_id) & (EntityVersion.entity == entity)
+    bump = (
+        update(EntityVersion)
+        .where(criteria)
+        .values(version=EntityVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if not (await db.execute(bump)).rowcount:
+        inserted = await db.execute(
+            insert_ignoring_conflicts(EntityVersion.__table__).values(user_id=user_id, entity=entity, version=1)
+        )
+        if not inserted.rowcount:
+            # Another transaction created the row first.
+            await db.execute(bump)
+    if created or updated or deleted:
+        version = await current_version(db, user_id, entity)
+        await record_changes(db, user_id, entity, version, created, updated, deleted)
+
+
+async def bump_users_versions(db: AsyncSession, user_ids, entity: str) -> None:
+    """Set-based `bump_version` for every user id selected by `user_ids`."""
+    ids = user_ids.subquery()
+    await db.execute(
+        update(EntityVersion)
+        .where(EntityVersion.user_id.in_(select(ids.c[0])) & (EntityVersion.entity == entity))
+        .values(version=EntityVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    has_row = select(EntityVersion.user_id).where(EntityVersion.entity == entity)
+    missing = select(ids.c[0], literal(entity), literal(1)).where(ids.c[0].not_in(has_row))
+    await db.execute(
+        insert_ignoring_conflicts(EntityVersion.__table__).from_select(["user_id", "entity", "version"], missing)
+    )
+
+
+async def current_version(db: AsyncSession, user_id: int, entity: str) -> int:
+    version = await db.scalar(
+        select(EntityVersion.version).where((EntityVersion.user_id == user_id) & (EntityVersion.entity == entity))
+    )
+    return version or 0
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" matches "x".
+    strip = lambda tag: tag.strip().removeprefix("W/")
+    return strip(etag) in {strip(tag) for tag in if_none_match.split(",")}
+
+
+async def check_not_modified(request: Request, response: Response, db: AsyncSession, user_id: int, entity: str) -> str:
+    """Raise 304 when the client already has the current version of `entity`;
+    otherwise set the ETag on `response` and return it."""
+    etag = f'W/"{user_id}-{entity}-{await current_version(db, user_id, entity)}"'
+    headers = etag_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return etag
+
+
+class VersionCheck:
+    """Dependency running `check_not_modified` for one entity; its value is
+    the ETag (pass it on to responses built by hand, e.g. `paginate`)."""
+
+    def __init__(self, entity: str):
+        self.entity = entity
+
+    async def __call__(self, request: Request, response: Response, db: ReadSessionDep, user: UserDep) -> str:
+        return await check_not_modified(request, response, db, user.id, self.entity)
+
+
+TodosVersion = Annotated[str, Depends(VersionCheck("todos"))]
+DiariesVersion = Annotated[str, Depends(VersionCheck("diaries"))]
+NotesVersion = Annotated[str, Depends(VersionCheck("notes"))]
+GoalsVersion = Annotated[str, Depends(VersionCheck("goals"))]
+
@@ -0,0 +1,134 @@
+"""Sync vs async database sessions under parallel load.
+
+Serves the same slow query from two small FastAPI apps: one runs it on a
+synchronous Session inside an `async def` handler (how the routers used to
+work), the other awaits it on an AsyncSession. While the slow requests are in
+flight a probe task that wakes every 5 ms records how late it was scheduled,
+i.e. how long the event loop was blocked.
+
+    python benchmarks/async_db.py --concurrency 16 --requests 64
+
+BENCH_DB may point at a Postgres/MySQL database (sync driver URL); the async
+driver is derived from it the same way backend/db.py does. Defaults to a
+temporary SQLite file.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+# Counts to `n` in a recursive CTE: pure database time, no rows transferred.
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) "
+    "SELECT count(*) FROM c"
+)
+
+
+def build_apps(db_url: str, work: int):
+    url = make_url(db_url)
+    sync_engine = create_engine(url)
+    async_engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)))
+
+    sync_app = FastAPI()
+    async_app = FastAPI()
+
+    @sync_app.get("/slow")
+    async def sync_slow():
+        with sync_engine.connect() as connection:
+            return connection.execute(SLOW_QUERY, {"n": work}).scalar()
+
+    @async_app.get("/slow")
+    async def async_slow():
+        async with async_engine.connect() as connection:
+            return (await connection.execute(SLOW_QUERY, {"n": work})).scalar()
+
+    return {"sync": sync_app, "async": async_app}, (sync_engine, async_engine)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_mode(app: FastAPI, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/slow")  # warm up the pool
+
+        semaphore = asyncio.Semaphore(concurrency)
+        slow_latencies: list[float] = []
+        loop_lags: list[float] = []
+        done = asyncio.Event()
+
+        async def slow_request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get("/slow")
+                response.raise_for_status()
+                slow_latencies.append(time.perf_counter() - started)
+
+        async def probe(interval: float = 0.005):
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(interval)
+                loop_lags.append(time.perf_counter() - started - interval)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(slow_request() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    return {
+        "throughput_rps": requests / elapsed,
+        "slow_p50_ms": statistics.median(slow_latencies) * 1000,
+        "slow_p95_ms": percentile(slow_latencies, 95) * 1000,
+        "loop_lag_p50_ms": statistics.median(loop_lags) * 1000,
+        "loop_lag_p95_ms": percentile(loop_lags, 95) * 1000,
+        "loop_lag_max_ms": max(loop_lags) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--work", type=int, default=300_000, help="rows generated by the slow query")
+    args = parser.parse_args()
+
+    db_url = os.getenv("BENCH_DB") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    apps, (sync_engine, async_engine) = build_apps(db_url, args.work)
+    try:
+        print(f"{args.requests} slow requests, concurrency {args.concurrency}, db {make_url(db_url).get_backend_name()}")
+        print(f"{'mode':<6} {'req/s':>8} {'slow p50':>10} {'slow p95':>10} {'lag p50':>10} {'lag p95':>10} {'lag max':>10}")
+        for mode, app in apps.items():
+            result = await run_mode(app, args.requests, args.concurrency)
+            print(
+                f"{mode:<6} {result['throughput_rps']:>8.1f} {result['slow_p50_ms']:>9.1f}ms "
+                f"{result['slow_p95_ms']:>9.1f}ms {result['loop_lag_p50_ms']:>9.1f}ms "
+                f"{result['loop_lag_p95_ms']:>9.1f}ms {result['loop_lag_max_ms']:>9.1f}ms"
+            )
+    finally:
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
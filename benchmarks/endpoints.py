@@ -0,0 +1,374 @@
+"""Latency, throughput and queries per request for every API endpoint.
+
+Seeds a database (benchmarks/seed.py), starts the app in process and drives a
+shuffled mix of requests against every router over an ASGI transport with
+`--concurrency` requests in flight. Reports p50/p95/p99 latency, request
+count, errors and SQL statements per request for each endpoint, plus overall
+throughput; `--output` writes the same as JSON and `--compare` prints the
+change against an earlier JSON run, e.g. from the previous commit.
+
+    python benchmarks/endpoints.py --requests 50 --concurrency 16 --output after.json --compare before.json
+
+BENCH_DB may point at a Postgres database (or any URL backend/db.py accepts);
+it must be empty or disposable. Defaults to a temporary SQLite file. Set
+ARGON2_TIME_COST to pin password hashing cost (login / register cost is
+dominated by it).
+
+Not driven: DELETE /users/me/ (it would delete the seeded accounts the rest
+of the run uses) and POST /users/me/validate-email (it needs the emailed
+one-time code, so every request would be a 400).
+"""
+import argparse
+import asyncio
+import contextvars
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["DB"] = os.getenv("BENCH_DB") or f"sqlite:///{tempfile.mkdtemp()}/endpoints.db"
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-32-bytes!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("EMAIL_TRANSPORT", "local")
+os.environ.setdefault("METRICS_TOKEN", "benchmark-only-metrics-token")
+
+import httpx  # noqa: E402
+from sqlalchemy import event, select  # noqa: E402
+
+from backend.db import SessionLocal, engine  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.routers.auth import create_access_token  # noqa: E402
+from backend.schemas import Tag  # noqa: E402
+from seed import PASSWORD, SeededUser, add_volume_arguments, seed, volumes  # noqa: E402
+
+# Statements executed on behalf of the current request; the app runs in the
+# client task, so the context variable follows each request.
+statements: contextvars.ContextVar[list | None] = contextvars.ContextVar("statements", default=None)
+
+
+def count_statement(*_):
+    counter = statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class Workload:
+    """Picks ids and payloads for requests. The first few seeded ids of each
+    kind are kept for DELETE requests, so reads and updates never miss."""
+
+    RESERVED = 5
+
+    def __init__(self, users: list[SeededUser], tags: list[str], rng: random.Random):
+        self.users = users
+        self.tags = tags
+        self.rng = rng
+        self.registered = 0
+        self.deletable = {
+            (user.id, kind): list(getattr(user, kind)[: self.RESERVED])
+            for user in users
+            for kind in ("todos", "diaries", "notes", "goals")
+        }
+
+    def id(self, user: SeededUser, kind: str) -> int:
+        return self.rng.choice(getattr(user, kind)[self.RESERVED:])
+
+    def deletable_id(self, user: SeededUser, kind: str) -> int | None:
+        ids = self.deletable[(user.id, kind)]
+        return ids.pop() if ids else None
+
+    def day(self) -> str:
+        return (date.today() - timedelta(days=self.rng.randrange(7))).isoformat()
+
+    def word(self) -> str:
+        return self.rng.choice(["plan", "review", "project", "idea", "family"])
+
+    def tag(self) -> str:
+        return self.rng.choice(self.tags)
+
+    def registration(self) -> dict:
+        self.registered += 1
+        name = f"registered{self.registered}"
+        return {"username": name, "password": PASSWORD, "email": f"{name}@example.com"}
+
+
+def get(path, **params):
+    return lambda w, u: ("GET", path, {"params": params} if params else {})
+
+
+def operator_get(path):
+    headers = {"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"}
+    return lambda w, u: ("GET", path, {"headers": headers})
+
+
+def by_id(method, path, kind, body=None):
+    return lambda w, u: (method, path.format(id=w.id(u, kind)), {} if body is None else {"json": body(w)})
+
+
+def delete(path, kind):
+    def build(w, u):
+        id = w.deletable_id(u, kind)
+        return None if id is None else ("DELETE", path.format(id=id), {})
+    return build
+
+
+def post(path, body):
+    return lambda w, u: ("POST", path, {"json": body(w)})
+
+
+def batch(data):
+    return lambda w: {"operations": [{"op": "create", "data": data(w, i)} for i in range(20)]}
+
+
+def import_ndjson(w) -> bytes:
+    records = [
+        {"type": kind, "title": f"imported {kind} {i}", "content": w.word(), "description": w.word(), "tags": [w.tag()]}
+        for i in range(10)
+        for kind in ("todo", "diary", "note", "goal")
+    ]
+    return b"".join(json.dumps(record).encode() + b"\n" for record in records)
+
+
+def import_zip(w) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(20):
+            folder = "notes" if i % 2 else "diaries"
+            archive.writestr(f"{folder}/imported-{i}.md", f"# Imported {i}\n\n_tags: {w.tag()}_\n\n{w.word()}\n")
+    return buffer.getvalue()
+
+
+def upload(filename, content):
+    return lambda w, u: ("POST", "/import", {"files": {"file": (filename, content(w))}})
+
+
+# name -> (relative weight, builder(workload, user) -> (method, url, httpx kwargs) or None to skip)
+ENDPOINTS = {
+    "POST /auth/register": (0.1, lambda w, u: ("POST", "/auth/register", {"json": w.registration()})),
+    "POST /auth/login": (0.2, lambda w, u: ("POST", "/auth/login", {"data": {"username": u.username, "password": PASSWORD}})),
+    "GET /users/me/": (1, get("/users/me/")),
+    # Profile updates write back the seeded values, so logins keep working.
+    "PUT /users/me/username": (0.1, lambda w, u: ("PUT", "/users/me/username", {"json": {"username": u.username}})),
+    "PUT /users/me/password": (0.1, lambda w, u: ("PUT", "/users/me/password", {"json": {"password": PASSWORD}})),
+    "PUT /users/me/email": (0.1, lambda w, u: ("PUT", "/users/me/email", {"json": {"email": f"{u.username}@example.com"}})),
+    "PUT /users/me/rollover": (0.2, lambda w, u: ("PUT", "/users/me/rollover", {"json": {"rollover": True}})),
+    "PUT /users/me/notifications": (0.2, lambda w, u: ("PUT", "/users/me/notifications", {"params": {"enable": False}})),
+    "PUT /users/me/notifications/disable": (0.2, lambda w, u: ("PUT", "/users/me/notifications/disable", {})),
+    "POST /users/me/send-validation-code": (0.1, lambda w, u: ("POST", "/users/me/send-validation-code", {})),
+    "GET /": (0.2, get("/")),
+    "GET /dashboard/summary": (1, get("/dashboard/summary")),
+    "GET /search": (1, lambda w, u: ("GET", "/search", {"params": {"q": w.word()}})),
+    "GET /sync": (0.5, get("/sync", limit=100)),
+    "POST /import (ndjson)": (0.1, upload("import.ndjson", import_ndjson)),
+    "POST /import (zip)": (0.1, upload("import.zip", import_zip)),
+    "GET /metrics": (0.2, operator_get("/metrics")),
+    "GET /metrics/slow-queries": (0.1, operator_get("/metrics/slow-queries")),
+
+    "GET /todos/": (1, get("/todos/", limit=50)),
+    "GET /todos/date/{date}": (1, lambda w, u: ("GET", f"/todos/date/{w.day()}", {})),
+    "GET /todos/{id}": (1, by_id("GET", "/todos/{id}", "todos")),
+    "GET /todos/search": (0.5, lambda w, u: ("GET", "/todos/search", {"params": {"query": w.word()}})),
+    "POST /todos/": (0.5, post("/todos/", lambda w: {"title": "bench todo", "description": w.word()})),
+    "PUT /todos/{id}": (0.3, by_id("PUT", "/todos/{id}", "todos", lambda w: {"title": "edited", "priority": "high"})),
+    "PUT /todos/{id}/status": (0.3, by_id("PUT", "/todos/{id}/status", "todos", lambda w: {"status": True})),
+    "DELETE /todos/{id}": (0.1, delete("/todos/{id}", "todos")),
+    "POST /todos/batch": (0.1, post("/todos/batch", batch(lambda w, i: {"title": f"batch {i}"}))),
+    "POST /todos/rollover": (0.1, lambda w, u: ("POST", "/todos/rollover", {})),
+
+    "GET /diaries/": (1, get("/diaries/", limit=50)),
+    "GET /diaries/date/{date}": (0.5, lambda w, u: ("GET", f"/diaries/date/{w.day()}", {})),
+    "GET /diaries/{id}": (0.5, by_id("GET", "/diaries/{id}", "diaries")),
+    "GET /diaries/search": (0.5, lambda w, u: ("GET", "/diaries/search", {"params": {"query": w.word()}})),
+    "POST /diaries/": (0.3, post("/diaries/", lambda w: {"title": "bench", "content": w.word()})),
+    "PUT /diaries/{id}": (0.2, by_id("PUT", "/diaries/{id}", "diaries", lambda w: {"title": "edited", "content": "edited"})),
+    "DELETE /diaries/{id}": (0.1, delete("/diaries/{id}", "diaries")),
+    "GET /diaries/export": (0.1, get("/diaries/export", format="markdown")),
+    "POST /diaries/batch": (0.1, post("/diaries/batch", batch(lambda w, i: {"title": f"batch {i}", "content": "body"}))),
+
+    "GET /notes/": (1, get("/notes/", limit=50)),
+    "GET /notes/?fields": (0.5, get("/notes/", limit=50, fields="id,title,tags")),
+    "GET /notes/?tag": (0.5, lambda w, u: ("GET", "/notes/", {"params": {"tag": [w.tag(), w.tag()], "match": "any"}})),
+    "GET /notes/tags": (0.5, get("/notes/tags")),
+    "GET /notes/date/{date}": (0.5, lambda w, u: ("GET", f"/notes/date/{w.day()}", {})),
+    "GET /notes/{id}": (0.5, by_id("GET", "/notes/{id}", "notes")),
+    "GET /notes/search": (0.5, lambda w, u: ("GET", "/notes/search", {"params": {"query": w.word()}})),
+    "POST /notes/": (0.3, post("/notes/", lambda w: {"title": "bench note", "content": "body", "tags": [w.tag(), "bench-new"]})),
+    "PUT /notes/{id}": (0.2, by_id("PUT", "/notes/{id}", "notes", lambda w: {"title": "edited", "content": "edited", "tags": [w.tag()]})),
+    "DELETE /notes/{id}": (0.1, delete("/notes/{id}", "notes")),
+    "GET /notes/export": (0.1, get("/notes/export", format="markdown")),
+    "GET /notes/export?format=ndjson": (0.1, get("/notes/export", format="ndjson")),
+    "GET /notes/export?format=zip": (0.1, get("/notes/export", format="zip")),
+    "POST /notes/batch": (0.1, post("/notes/batch", batch(lambda w, i: {"title": f"batch {i}", "content": "body", "tags": [w.tag()]}))),
+
+    "GET /goals/": (1, get("/goals/", limit=50)),
+    "GET /goals/{id}": (0.5, by_id("GET", "/goals/{id}", "goals")),
+    "GET /goals/search": (0.5, lambda w, u: ("GET", "/goals/search", {"params": {"query": w.word()}})),
+    "POST /goals/": (0.3, post("/goals/", lambda w: {"title": "bench goal", "description": w.word()})),
+    "PUT /goals/{id}": (0.2, by_id("PUT", "/goals/{id}", "goals", lambda w: {"title": "edited", "description": "edited"})),
+    "PUT /goals/complete/{id}": (0.2, by_id("PUT", "/goals/complete/{id}", "goals")),
+    "DELETE /goals/{id}": (0.1, delete("/goals/{id}", "goals")),
+    "POST /goals/batch": (0.1, post("/goals/batch", batch(lambda w, i: {"title": f"batch {i}", "description": "body"}))),
+}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies: list[float], queries: list[int], errors: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "queries_per_request": round(statistics.mean(queries), 2),
+    }
+
+
+async def drive(client: httpx.AsyncClient, workload: Workload, requests: int, concurrency: int, rng: random.Random) -> dict:
+    plan = [
+        name
+        for name, (weight, _) in ENDPOINTS.items()
+        for _ in range(max(1, round(weight * requests)))
+    ]
+    rng.shuffle(plan)
+    tokens = {
+        user.id: {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)}, timedelta(hours=1))}"}
+        for user in workload.users
+    }
+    latencies, queries, errors = defaultdict(list), defaultdict(list), defaultdict(int)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(name: str):
+        user = rng.choice(workload.users)
+        built = ENDPOINTS[name][1](workload, user)
+        if built is None:
+            return
+        method, url, kwargs = built
+        headers = {**tokens[user.id], **kwargs.pop("headers", {})}
+        async with semaphore:
+            counter = [0]
+            token = statements.set(counter)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                statements.reset(token)
+        latencies[name].append(elapsed)
+        queries[name].append(counter[0])
+        if response.status_code >= 400:
+            errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(name) for name in plan))
+    elapsed = time.perf_counter() - started
+
+    every_latency = [value for values in latencies.values() for value in values]
+    every_query = [value for values in queries.values() for value in values]
+    return {
+        "overall": {
+            **summarize(every_latency, every_query, sum(errors.values())),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(every_latency) / elapsed, 2),
+        },
+        "endpoints": {
+            name: summarize(latencies[name], queries[name], errors[name]) for name in ENDPOINTS if latencies[name]
+        },
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def change(after: float, before: float) -> str:
+    if not before:
+        return ""
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+def print_report(result: dict, baseline: dict | None) -> None:
+    columns = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+    print(f"{'endpoint':<38}{'n':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}" + ("  vs baseline p50 / p95 / q" if baseline else ""))
+    rows = [*result["endpoints"].items(), ("overall", result["overall"])]
+    for name, stats in rows:
+        line = f"{name:<38}" + "".join(
+            f"{stats[column]:>{width}}" if isinstance(stats[column], int) else f"{stats[column]:>{width}.1f}"
+            for column, width in zip(columns, (6, 5, 9, 9, 9, 7))
+        )
+        before = (baseline or {}).get("endpoints", {}).get(name) if name != "overall" else (baseline or {}).get("overall")
+        if before:
+            line += "  " + " / ".join(
+                change(stats[column], before[column]) or "-" for column in ("p50_ms", "p95_ms", "queries_per_request")
+            )
+        print(line)
+    print(f"throughput {result['overall']['throughput_rps']:.1f} req/s over {result['overall']['seconds']:.1f}s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_volume_arguments(parser)
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint at weight 1")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+    rng = random.Random(args.seed)
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        users = await seed(SessionLocal, **volumes(args))
+        seed_seconds = time.perf_counter() - started
+        async with SessionLocal() as db:
+            tags = list(await db.scalars(select(Tag.name)))
+        workload = Workload(users, tags, rng)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            result = await drive(client, workload, args.requests, args.concurrency, rng)
+    await engine.dispose()
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "database": engine.dialect.name,
+            "volumes": volumes(args),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed_seconds": round(seed_seconds, 3),
+        },
+        **result,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(
+        f"{engine.dialect.name}, {args.users} users x {args.todos} todos / {args.diaries} diaries / "
+        f"{args.notes} notes / {args.goals} goals, concurrency {args.concurrency}"
+    )
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""Synthetic data for benchmarks.
+
+Creates `users` accounts, each holding the given number of todos, diaries,
+notes (with tags drawn from a shared vocabulary) and goals, spread over the
+last `days` days. Rows go in with multi-row INSERTs, so seeding thousands of
+entries takes seconds. The same `seed` value always produces the same data.
+
+    DB=sqlite:///bench.db python benchmarks/seed.py --users 20 --todos 500 --notes 500
+
+Every account's password is PASSWORD. Needs INSERT ... RETURNING (SQLite or
+Postgres) and existing tables; run the app (or benchmarks/endpoints.py) once
+first.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert  # noqa: E402
+
+from backend.passwords import password_hasher  # noqa: E402
+from backend.schemas import Diary, Goal, Note, Tag, Todo, User, note_tags  # noqa: E402
+
+PASSWORD = "benchmark-password"
+PRIORITIES = ["low", "medium", "high"]
+WORDS = (
+    "plan review write call email read fix ship design test budget travel gym "
+    "groceries meeting project idea garden book family health music code"
+).split()
+
+
+@dataclass
+class SeededUser:
+    id: int
+    username: str
+    todos: list[int] = field(default_factory=list)
+    diaries: list[int] = field(default_factory=list)
+    notes: list[int] = field(default_factory=list)
+    goals: list[int] = field(default_factory=list)
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+async def insert_returning_ids(db, model, rows: list[dict]) -> list[int]:
+    if not rows:
+        return []
+    return list(await db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+
+async def seed(
+    session_factory,
+    users: int = 10,
+    todos: int = 200,
+    diaries: int = 100,
+    notes: int = 200,
+    goals: int = 20,
+    tags: int = 50,
+    tags_per_note: int = 3,
+    days: int = 30,
+    seed: int = 0,
+    prefix: str = "bench",
+) -> list[SeededUser]:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    hashed_password = await password_hasher.hash(PASSWORD)
+
+    def moment() -> datetime:
+        return now - timedelta(seconds=rng.randrange(days * 86400))
+
+    seeded = []
+    async with session_factory() as db:
+        vocabulary = [f"{prefix}-{word}-{i}" for i, word in enumerate(rng.choices(WORDS, k=tags))]
+        tag_ids = await insert_returning_ids(db, Tag, [{"name": name} for name in vocabulary])
+
+        user_ids = await insert_returning_ids(db, User, [
+            {
+                "username": f"{prefix}{i}",
+                "email": f"{prefix}{i}@example.com",
+                "hashed_password": hashed_password,
+                "email_validated": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(users)
+        ])
+        for i, user_id in enumerate(user_ids):
+            user = SeededUser(id=user_id, username=f"{prefix}{i}")
+            user.todos = await insert_returning_ids(db, Todo, [
+                {
+                    "title": text(rng, 4),
+                    "description": text(rng, 15),
+                    "priority": rng.choice(PRIORITIES),
+                    "status": rng.random() < 0.5,
+                    "edited": False,
+                    "entry_datetime": moment(),
+                    "user_id": user_id,
+                }
+                for _ in range(todos)
+            ])
+            user.diaries = await insert_returning_ids(db, Diary, [
+                {"title": text(rng, 4), "content": text(rng, 120), "edited": False, "entry_datetime": moment(), "user_id": user_id}
+                for _ in range(diaries)
+            ])
+            user.notes = await insert_returning_ids(db, Note, [
+                {
+                    "title": text(rng, 4),
+                    "content": text(rng, 80),
+                    "is_pinned": rng.random() < 0.1,
+                    "is_archived": rng.random() < 0.2,
+                    "created_at": moment(),
+                    "user_id": user_id,
+                }
+                for _ in range(notes)
+            ])
+            links = [
+                {"note_id": note_id, "tag_id": tag_id}
+                for note_id in user.notes
+                for tag_id in rng.sample(tag_ids, min(tags_per_note, len(tag_ids)))
+            ]
+            if links:
+                await db.execute(insert(note_tags), links)
+            user.goals = await insert_returning_ids(db, Goal, [
+                {
+                    "title": text(rng, 4),
+                    "description": text(rng, 20),
+                    "is_completed": rng.random() < 0.3,
+                    "created_at": moment(),
+                    "target_date": now + timedelta(days=rng.randrange(1, 365)),
+                    "user_id": user_id,
+                }
+                for _ in range(goals)
+            ])
+            seeded.append(user)
+        await db.commit()
+    return seeded
+
+
+def add_volume_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--todos", type=int, default=200, help="per user")
+    parser.add_argument("--diaries", type=int, default=100, help="per user")
+    parser.add_argument("--notes", type=int, default=200, help="per user")
+    parser.add_argument("--goals", type=int, default=20, help="per user")
+    parser.add_argument("--tags", type=int, default=50, help="shared tag vocabulary")
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--days", type=int, default=30, help="entries are spread over this many days")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def volumes(args: argparse.Namespace) -> dict:
+    return {
+        name: getattr(args, name)
+        for name in ("users", "todos", "diaries", "notes", "goals", "tags", "tags_per_note", "days", "seed")
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_volume_arguments(parser)
+    parser.add_argument("--prefix", default="bench", help="username / tag prefix; must be unused")
+    args = parser.parse_args()
+
+    from backend.db import SessionLocal, engine
+
+    seeded = await seed(SessionLocal, prefix=args.prefix, **volumes(args))
+    await engine.dispose()
+    print(f"seeded {len(seeded)} users ({seeded[0].username}..{seeded[-1].username}), password {PASSWORD!r}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
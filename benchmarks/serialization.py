@@ -0,0 +1,133 @@
+"""Per-row cost of the default and fast list serialization paths.
+
+Seeds a throwaway SQLite database and times, per row:
+
+* encode — turning already fetched rows into the response body: ORM objects
+  through `model_validate` + `jsonable_encoder` + the stdlib encoder, against
+  column rows through plain dicts + orjson;
+* page — a whole `paginate` call (query, row building, encoding) with
+  `fast=False` and `fast=True`.
+
+    python benchmarks/serialization.py --rows 500 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["DB"] = f"sqlite:///{tempfile.mkdtemp()}/serialization.db"
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-32-bytes!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("EMAIL_TRANSPORT", "local")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from backend.db import SessionLocal, engine  # noqa: E402
+from backend.main import create_db_and_tables  # noqa: E402
+from backend.models import ReturnDiary, ReturnGoal, ReturnNote, ReturnTodo  # noqa: E402
+from backend.pagination import PageParams, paginate  # noqa: E402
+from backend.schemas import Diary, Goal, Note, Tag, Todo, User  # noqa: E402
+from backend.serialization import ORJSONResponse, build_rows  # noqa: E402
+
+CASES = [
+    (Todo, ReturnTodo, Todo.entry_datetime),
+    (Diary, ReturnDiary, Diary.entry_datetime),
+    (Note, ReturnNote, Note.created_at),
+    (Goal, ReturnGoal, Goal.created_at),
+]
+
+
+async def seed(rows: int) -> int:
+    now = datetime.now()
+    async with SessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        tags = [Tag(name=f"tag{i}") for i in range(10)]
+        db.add_all(tags)
+        for i in range(rows):
+            at = now - timedelta(minutes=i)
+            db.add(Todo(title=f"todo {i}", description="description " * 8, priority="medium", status=False,
+                        edited=False, user_id=user.id, entry_datetime=at))
+            db.add(Diary(title=f"entry {i}", content="dear diary " * 40, edited=False, user_id=user.id, entry_datetime=at))
+            db.add(Note(title=f"note {i}", content="note body " * 40, is_pinned=False, is_archived=False,
+                        user_id=user.id, created_at=at, tags=tags[i % 7:i % 7 + 3]))
+            db.add(Goal(title=f"goal {i}", description="description " * 8, is_completed=False,
+                        user_id=user.id, created_at=at))
+        await db.commit()
+        return user.id
+
+
+def per_row(seconds: float, rows: int, repeat: int) -> float:
+    return seconds / (rows * repeat) * 1e6
+
+
+async def time_encode(model, response_model, user_id: int, rows: int, repeat: int) -> tuple[float, float]:
+    names = list(response_model.model_fields)
+    async with SessionLocal() as db:
+        objects = (await db.scalars(select(model).where(model.user_id == user_id).limit(rows))).all()
+        columns = [getattr(model, name) for name in names if name in model.__table__.columns]
+        column_rows = (await db.execute(select(*columns).where(model.user_id == user_id).limit(rows))).all()
+        if model.__mapper__.relationships:
+            # Relationship rows cost a query; encode the dicts once built.
+            dicts = await build_rows(db, model, response_model, column_rows, names)
+            build = lambda: dicts  # noqa: E731
+        else:
+            build = lambda: [{name: row._mapping[name] for name in names} for row in column_rows]  # noqa: E731
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        JSONResponse(content=jsonable_encoder([response_model.model_validate(o) for o in objects]))
+    slow = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ORJSONResponse(content=build())
+    fast = time.perf_counter() - start
+    return per_row(slow, len(objects), repeat), per_row(fast, len(objects), repeat)
+
+
+async def time_page(model, response_model, timestamp_column, user_id: int, rows: int, repeat: int) -> tuple[float, float]:
+    page = PageParams(limit=rows)
+    results = []
+    for fast in (False, True):
+        async with SessionLocal() as db:
+            query = select(model).where(model.user_id == user_id)
+            await paginate(db, query, page, model, response_model, timestamp_column, fast=fast)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                db.expunge_all()
+                await paginate(db, query, page, model, response_model, timestamp_column, fast=fast)
+            results.append(per_row(time.perf_counter() - start, rows, repeat))
+    return results[0], results[1]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    await create_db_and_tables()
+    user_id = await seed(args.rows)
+
+    print(f"{'µs per row':<12}{'encode':>10}{'fast':>10}{'speedup':>9}{'page':>10}{'fast':>10}{'speedup':>9}")
+    for model, response_model, timestamp_column in CASES:
+        encode = await time_encode(model, response_model, user_id, args.rows, args.repeat)
+        page = await time_page(model, response_model, timestamp_column, user_id, args.rows, args.repeat)
+        print(
+            f"{model.__name__:<12}"
+            f"{encode[0]:>10.1f}{encode[1]:>10.1f}{encode[0] / encode[1]:>8.1f}x"
+            f"{page[0]:>10.1f}{page[1]:>10.1f}{page[0] / page[1]:>8.1f}x"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -67,6 +67,10 @@ export const API_BASE_URL = isProduction
   ? 'https://lumina-app.onrender.com' 
   : 'http://localhost:8000';
 
+// Token from the last write response; sending it back keeps reads on the
+// primary database (not a replica) until it expires, so writes show up at once.
+let readPrimaryToken = null;
+
 export const apiClient = {
   async request(endpoint, options = {}) {
     const token = localStorage.getItem('token');
@@ -78,12 +82,16 @@ export const apiClient = {
     if (token && !options.skipAuth) {
       headers['Authorization'] = `Bearer ${token}`;
     }
+    if (readPrimaryToken) {
+      headers['X-Read-Primary'] = readPrimaryToken;
+    }
 
     try {
       const response = await fetch(`${API_BASE_URL}${endpoint}`, {
         ...options,
         headers,
       });
+      readPrimaryToken = response.headers.get('X-Read-Primary') || readPrimaryToken;
 
       if (response.status === 401) {
         localStorage.removeItem('token');
@@ -100,7 +108,8 @@ export const apiClient = {
         return null;
       }
 
-      return response.json();
+      const data = await response.json();
+      return options.withHeaders ? { data, headers: response.headers } : data;
     } catch (error) {
       console.error("API Request Error:", error);
       throw error;
@@ -111,6 +120,20 @@ export const apiClient = {
     return this.request(endpoint);
   },
 
+  // Follows the X-Next-Cursor header of paginated list endpoints
+  async getAllPages(endpoint, limit = 500) {
+    const items = [];
+    let cursor = null;
+    do {
+      const separator = endpoint.includes('?') ? '&' : '?';
+      const page = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+      const { data, headers } = await this.request(`${endpoint}${separator}limit=${limit}${page}`, { withHeaders: true });
+      items.push(...data);
+      cursor = headers.get('X-Next-Cursor');
+    } while (cursor);
+    return items;
+  },
+
   post(endpoint, data) {
     return this.request(endpoint, {
       method: 'POST',
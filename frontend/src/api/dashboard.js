@@ -0,0 +1,5 @@
+import { apiClient } from './client';
+
+export const dashboardApi = {
+  getSummary: () => apiClient.get('/dashboard/summary'),
+};
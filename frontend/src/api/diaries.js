@@ -1,10 +1,11 @@
 import { apiClient } from './client';
 
 export const diariesApi = {
-  getAll: () => apiClient.get('/diaries/'),
+  getAll: () => apiClient.getAllPages('/diaries/'),
   getById: (id) => apiClient.get(`/diaries/${id}`),
   getByDate: (date) => apiClient.get(`/diaries/date/${date}`),
   create: (data) => apiClient.post('/diaries/', data),
+  batch: (operations) => apiClient.post('/diaries/batch', { operations }),
   update: (id, data) => apiClient.put(`/diaries/${id}`, data),
   delete: (id) => apiClient.delete(`/diaries/${id}`),
 };
\ No newline at end of file
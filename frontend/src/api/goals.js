@@ -1,9 +1,10 @@
 import { apiClient } from './client';
 
 export const goalsApi = {
-  getAll: () => apiClient.get('/goals/'),
+  getAll: () => apiClient.getAllPages('/goals/'),
   getById: (id) => apiClient.get(`/goals/${id}`),
   create: (data) => apiClient.post('/goals/', data),
+  batch: (operations) => apiClient.post('/goals/batch', { operations }),
   update: (id, data) => apiClient.put(`/goals/${id}`, data),
   complete: (id) => apiClient.put(`/goals/complete/${id}`, {}),
   delete: (id) => apiClient.delete(`/goals/${id}`),
@@ -1,8 +1,15 @@
 import { apiClient } from './client';
 
 export const notesApi = {
-  getAll: () => apiClient.get('/notes/'),
+  getAll: () => apiClient.getAllPages('/notes/'),
+  getByTags: (tags, match = 'all') => {
+    const params = new URLSearchParams(tags.map((tag) => ['tag', tag]));
+    params.set('match', match);
+    return apiClient.getAllPages(`/notes/?${params}`);
+  },
+  getTags: () => apiClient.get('/notes/tags'),
   create: (data) => apiClient.post('/notes/', data),
+  batch: (operations) => apiClient.post('/notes/batch', { operations }),
   update: (id, data) => apiClient.put(`/notes/${id}`, data),
   delete: (id) => apiClient.delete(`/notes/${id}`),
 };
\ No newline at end of file
@@ -0,0 +1,5 @@
+import { apiClient } from './client';
+
+export const searchApi = {
+  search: (query, limit = 5) => apiClient.get(`/search?q=${encodeURIComponent(query)}&limit=${limit}`),
+};
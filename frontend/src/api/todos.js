@@ -1,9 +1,10 @@
 import { apiClient } from './client';
 
 export const todosApi = {
-  getAll: () => apiClient.get('/todos/'),
+  getAll: () => apiClient.getAllPages('/todos/'),
   getByDate: (date) => apiClient.get(`/todos/date/${date}`),
   create: (data) => apiClient.post('/todos/', data),
+  batch: (operations) => apiClient.post('/todos/batch', { operations }),
   update: (id, data) => apiClient.put(`/todos/${id}`, data),
   updateStatus: (id, status) => apiClient.put(`/todos/${id}/status`, { status }),
   delete: (id) => apiClient.delete(`/todos/${id}`),
@@ -1,10 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { Home, CheckCircle2, Book, StickyNote, Trophy, Settings, X, Sparkles, Search, Loader2, ChevronRight, FileText } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
-import { notesApi } from '../../api/notes';
-import { todosApi } from '../../api/todos';
-import { diariesApi } from '../../api/diaries';
-import { goalsApi } from '../../api/goals';
+import { searchApi } from '../../api/search';
 
 const Sidebar = ({ isOpen, onClose, currentPage, setCurrentPage }) => {
   const links = [
@@ -28,14 +25,11 @@ const Sidebar = ({ isOpen, onClose, currentPage, setCurrentPage }) => {
       if (term.length > 1) {
         setLoading(true);
         try {
-          // Fetch everything to filter locally (or replace with backend search endpoints)
-          const [notes, todos, diaries, goals] = await Promise.all([
-            notesApi.getAll().then(res => res.filter(n => n.title.toLowerCase().includes(term.toLowerCase()))),
-            todosApi.getAll().then(res => res.filter(t => t.title.toLowerCase().includes(term.toLowerCase()))),
-            diariesApi.getAll().then(res => res.filter(d => d.title?.toLowerCase().includes(term.toLowerCase()))),
-            goalsApi.getAll().then(res => res.filter(g => g.title.toLowerCase().includes(term.toLowerCase())))
-          ]);
-          
+          // One ranked request across all entity types, grouped by type for display
+          const hits = await searchApi.search(term);
+          const ofType = (type) => hits.filter(hit => hit.type === type);
+          const [notes, todos, diaries, goals] = ['note', 'todo', 'diary', 'goal'].map(ofType);
+
           const hasResults = notes.length || todos.length || diaries.length || goals.length;
           setResults(hasResults ? { notes, todos, diaries, goals } : { empty: true });
         } catch (error) {
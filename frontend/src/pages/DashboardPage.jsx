@@ -1,10 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { CheckCircle2, BookOpen, StickyNote, Trophy, ArrowUpRight, Flame, Quote } from 'lucide-react';
-import { todosApi } from '../api/todos';
-import { diariesApi } from '../api/diaries';
-import { notesApi } from '../api/notes';
-import { goalsApi } from '../api/goals';
+import { dashboardApi } from '../api/dashboard';
 import { MOTIVATIONAL_QUOTES } from '../constants';
 
 const StatWidget = ({ title, value, subtitle, icon: Icon, color, delay, onClick }) => (
@@ -33,40 +30,15 @@ const DashboardPage = ({ onNavigate }) => {
   const [quote, setQuote] = useState({ text: "Loading...", author: "" });
 
   useEffect(() => {
-    // 1. Fetch Stats & Calculate Streak
-    Promise.all([
-      todosApi.getAll(),
-      diariesApi.getAll(),
-      notesApi.getAll(),
-      goalsApi.getAll(),
-    ]).then(([todos, diaries, notes, goals]) => {
-      const today = new Date().toISOString().split('T')[0];
+    // 1. Fetch Stats & Streak (aggregated on the server)
+    dashboardApi.getSummary().then((summary) => {
       setStats({
-        todos: todos.filter(t => !t.status).length,
-        diary: diaries.filter(d => d.entry_datetime?.startsWith(today)).length,
-        notes: notes.length,
-        goals: goals.filter(g => !g.is_completed).length,
+        todos: summary.pending_todos,
+        diary: summary.diary_entries_today,
+        notes: summary.notes,
+        goals: summary.active_goals,
       });
-
-      // Simple Streak Calculation (Consecutive days with at least one completed task)
-      const completedDates = new Set(
-        todos.filter(t => t.status).map(t => t.completed_datetime?.split('T')[0])
-      );
-      let currentStreak = 0;
-      let checkDate = new Date();
-      while (true) {
-        const dateStr = checkDate.toISOString().split('T')[0];
-        if (completedDates.has(dateStr)) {
-          currentStreak++;
-          checkDate.setDate(checkDate.getDate() - 1);
-        } else if (currentStreak === 0 && checkDate.toDateString() === new Date().toDateString()) {
-           // Allow streak to start today even if not finished yet, check yesterday
-           checkDate.setDate(checkDate.getDate() - 1);
-        } else {
-          break;
-        }
-      }
-      setStreak(currentStreak);
+      setStreak(summary.streak);
     });
 
     // 2. Fetch Quote (Mock or API)
@@ -0,0 +1,59 @@
+"""Shared test setup: a throwaway SQLite database and the local email sink.
+
+The backend reads its settings when it is imported, so they are set here,
+before any test module imports it.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["DB"] = f"sqlite:///{tempfile.mkdtemp(prefix='lumina-tests-')}/lumina.db"
+os.environ.pop("DB_REPLICAS", None)
+os.environ["EMAIL_TRANSPORT"] = "local"
+os.environ.setdefault("SECRET_KEY", "test-only-secret-key-of-32-bytes!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ARGON2_TIME_COST", "1")
+os.environ["METRICS_TOKEN"] = "test-metrics-token"
+
+_usernames = itertools.count()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="module")
+def client():
+    """A TestClient running the app's lifespan (tables, migrations, workers)."""
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(client):
+    """Registers and logs in a new user; returns their Authorization header."""
+
+    def make_user(password: str = "test-password") -> dict:
+        username = f"user{next(_usernames)}"
+        response = client.post(
+            "/auth/register", json={"username": username, "password": password, "email": f"{username}@example.com"}
+        )
+        assert response.status_code == 201, response.text
+        response = client.post("/auth/login", data={"username": username, "password": password})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return make_user
+
+
+@pytest.fixture
+def auth_headers(make_user) -> dict:
+    return make_user()
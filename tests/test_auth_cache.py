@@ -0,0 +1,36 @@
+"""The authenticated-user cache must not let writes through for an account
+that another worker deleted."""
+from sqlalchemy import delete
+
+from backend.db import SessionLocal
+from backend.schemas import User
+
+
+def delete_behind_the_cache(client, headers) -> None:
+    """Delete the user's row directly, as another worker would: this
+    process's cache is not invalidated."""
+    user_id = client.get("/users/me/", headers=headers).json()["id"]
+
+    async def remove():
+        async with SessionLocal() as db:
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+    client.portal.call(remove)
+
+
+def test_writes_revalidate_a_cached_user(client, auth_headers):
+    assert client.get("/todos/", headers=auth_headers).status_code == 200
+    delete_behind_the_cache(client, auth_headers)
+
+    response = client.post("/todos/", json={"title": "after delete"}, headers=auth_headers)
+    assert response.status_code == 401
+
+
+def test_reads_use_the_cache(client, auth_headers):
+    from backend.principal_cache import cache_hits
+
+    client.get("/todos/", headers=auth_headers)
+    hits = cache_hits.value()
+    assert client.get("/todos/", headers=auth_headers).status_code == 200
+    assert cache_hits.value() == hits + 1
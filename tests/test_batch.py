@@ -0,0 +1,47 @@
+"""Batch creates are one multi-row INSERT, whatever the number of rows."""
+import pytest
+
+from backend.instrumentation import request_statements
+from backend.principal_cache import principal_cache
+
+CREATES = {
+    "todos": lambda n: {"title": f"todo {n}"},
+    "diaries": lambda n: {"title": f"entry {n}", "content": "body"},
+    "notes": lambda n: {"title": f"note {n}", "content": "body", "tags": ["shared", f"own{n}"]},
+    "goals": lambda n: {"title": f"goal {n}", "description": "body"},
+}
+
+
+@pytest.fixture(autouse=True)
+def no_auth_cache(monkeypatch):
+    # Every request loads the user, so a cache hit or miss cannot change the count.
+    monkeypatch.setattr(principal_cache, "ttl", 0)
+    principal_cache.clear()
+
+
+def create_batch(client, headers, entity: str, count: int) -> tuple[list[dict], int]:
+    """(results, statements run) for a batch of `count` creates."""
+    route = f"/{entity}/batch"
+    before = request_statements.sum(route=route, method="POST")
+    operations = [{"op": "create", "data": CREATES[entity](n)} for n in range(count)]
+    response = client.post(route, json={"operations": operations}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json(), int(request_statements.sum(route=route, method="POST") - before)
+
+
+@pytest.mark.parametrize("entity", CREATES)
+def test_batch_creates_use_a_constant_number_of_statements(client, make_user, entity):
+    _, few = create_batch(client, make_user(), entity, 3)
+    _, many = create_batch(client, make_user(), entity, 40)
+    assert many == few
+
+
+def test_batch_created_notes_get_their_ids_and_tags(client, auth_headers):
+    results, _ = create_batch(client, auth_headers, "notes", 5)
+    assert [result["status"] for result in results] == [201] * 5
+
+    notes = {note["id"]: note for note in client.get("/notes/", headers=auth_headers).json()}
+    for n, result in enumerate(results):
+        note = notes[result["id"]]
+        assert note["title"] == f"note {n}"
+        assert sorted(tag["name"] for tag in note["tags"]) == ["own" + str(n), "shared"]
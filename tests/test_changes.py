@@ -0,0 +1,34 @@
+"""The portable upsert used for change records on dialects without a native one."""
+import pytest
+from sqlalchemy import delete, select
+
+from backend.db import SessionLocal, engine, update_then_insert
+from backend.schemas import Base, SyncChange
+
+pytestmark = pytest.mark.anyio
+
+
+def change(entity_id: int, version: int, deleted: bool = False) -> dict:
+    return {"user_id": 1, "entity": "upsert-test", "entity_id": entity_id,
+            "version": version, "created_version": version, "deleted": deleted}
+
+
+async def test_update_then_insert_updates_existing_rows_and_adds_the_rest():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(delete(SyncChange).where(SyncChange.entity == "upsert-test"))
+    try:
+        async with SessionLocal() as db:
+            await update_then_insert(db, SyncChange.__table__, ["version", "deleted"], [change(1, 1), change(2, 1)])
+            await update_then_insert(db, SyncChange.__table__, ["version", "deleted"], [change(2, 5, deleted=True), change(3, 5)])
+            await db.commit()
+            rows = (await db.execute(
+                select(SyncChange.entity_id, SyncChange.version, SyncChange.created_version, SyncChange.deleted)
+                .where(SyncChange.entity == "upsert-test")
+                .order_by(SyncChange.entity_id)
+            )).tuples().all()
+    finally:
+        await engine.dispose()
+
+    # Updated rows keep their created_version; only `columns` are overwritten.
+    assert rows == [(1, 1, 1, False), (2, 5, 1, True), (3, 5, 5, False)]
@@ -0,0 +1,45 @@
+"""Exports of entries without a timestamp (rows older than the NOT NULL
+migration, or diaries saved without a date)."""
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from backend import export
+from backend.export import DIARIES, NOTES, diary_markdown, entry_filename, note_markdown
+from backend.imports import parse_markdown
+
+NOTE = {"id": 7, "title": "Plans", "content": "Body", "created_at": None,
+        "tags": [{"name": "work"}], "is_pinned": True, "is_archived": False}
+DIARY = {"id": 3, "title": None, "content": "Dear diary", "entry_datetime": None}
+
+
+def test_markdown_omits_a_missing_date():
+    assert note_markdown(NOTE) == "# Plans\n\n_tags: work · pinned_\n\nBody\n"
+    assert diary_markdown(DIARY) == "# Untitled\n\nDear diary\n"
+
+
+def test_markdown_without_a_date_imports_back():
+    record = parse_markdown(note_markdown(NOTE), "default")
+    assert record["tags"] == ["work"] and record["is_pinned"] and record["content"] == "Body"
+    assert "created_at" not in record
+
+
+def test_filenames_omit_a_missing_date():
+    assert entry_filename(NOTES, NOTE) == "notes/plans-7.md"
+    assert entry_filename(DIARIES, DIARY) == "diaries/untitled-3.md"
+    dated = {**NOTE, "created_at": datetime(2024, 5, 1, 9, 30)}
+    assert entry_filename(NOTES, dated) == "notes/2024-05-01-plans-7.md"
+
+
+@pytest.mark.anyio
+async def test_zip_dates_fall_back_to_1980(monkeypatch):
+    async def chunks(spec, user_id):
+        yield [NOTE, {**NOTE, "id": 8, "created_at": datetime(1975, 1, 1)}, {**NOTE, "id": 9, "created_at": datetime(2024, 5, 1, 9, 30)}]
+
+    monkeypatch.setattr(export, "export_chunks", chunks)
+    data = b"".join([part async for part in export.zip_stream(NOTES, user_id=1)])
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        dates = [info.date_time for info in archive.infolist()]
+    assert dates == [(1980, 1, 1, 0, 0, 0), (1980, 1, 1, 0, 0, 0), (2024, 5, 1, 9, 30, 0)]
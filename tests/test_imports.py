@@ -0,0 +1,54 @@
+"""Limits on what POST /import holds in memory for a single record."""
+import io
+import zipfile
+
+import orjson
+import pytest
+from fastapi import UploadFile
+
+from backend import imports
+from backend.imports import RecordError, ndjson_records
+
+
+@pytest.fixture
+def small_limits(monkeypatch):
+    monkeypatch.setattr(imports, "IMPORT_MAX_RECORD_BYTES", 64)
+    # Smaller than the long line, so it spans several reads.
+    monkeypatch.setattr(imports, "READ_CHUNK_SIZE", 16)
+
+
+def lines(*records) -> bytes:
+    return b"".join(record if isinstance(record, bytes) else orjson.dumps(record) + b"\n" for record in records)
+
+
+@pytest.mark.anyio
+async def test_ndjson_rejects_long_lines_and_carries_on(small_limits):
+    body = lines({"type": "note", "title": "a"}, b'{"title": "' + b"x" * 200 + b'"}\n', {"type": "note", "title": "b"})
+    results = [item async for item in ndjson_records(UploadFile(io.BytesIO(body)))]
+
+    assert [location for location, _ in results] == [{"line": 1}, {"line": 2}, {"line": 3}]
+    assert isinstance(results[1][1], RecordError) and "longer than 64 bytes" in str(results[1][1])
+    assert [record["title"] for _, record in (results[0], results[2])] == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_ndjson_rejects_a_long_last_line(small_limits):
+    results = [item async for item in ndjson_records(UploadFile(io.BytesIO(b"y" * 200)))]
+    assert len(results) == 1 and isinstance(results[0][1], RecordError)
+
+
+def test_zip_members_over_the_limit_are_rejected(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(imports, "IMPORT_MAX_RECORD_BYTES", 1024)
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("notes/small.md", "# Small\n\nfits")
+        # Compresses to a few bytes; the declared size is what counts.
+        archive.writestr("notes/large.md", "# Large\n\n" + "z" * 100_000)
+
+    response = client.post(
+        "/import", files={"file": ("notes.zip", data.getvalue(), "application/zip")}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    results = [orjson.loads(line) for line in response.content.splitlines()]
+    assert {"file": "notes/large.md", "error": "File larger than 1024 bytes"} in results
+    assert results[-1]["imported"]["notes"] == 1
@@ -0,0 +1,32 @@
+"""/metrics is only served to the holder of METRICS_TOKEN."""
+import os
+
+import pytest
+
+from backend import instrumentation
+
+
+def metrics_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_metrics_require_the_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=metrics_headers("wrong")).status_code == 401
+
+
+def test_metrics_with_the_token(client, auth_headers):
+    client.get("/todos/", headers=auth_headers)
+    response = client.get("/metrics", headers=metrics_headers(os.environ["METRICS_TOKEN"]))
+    assert response.status_code == 200
+    assert 'lumina_http_requests_total{method="GET",route="/todos/",status="200"}' in response.text
+
+
+def test_user_tokens_are_not_metrics_tokens(client, auth_headers):
+    assert client.get("/metrics", headers=auth_headers).status_code == 401
+
+
+@pytest.mark.parametrize("token", [None, ""])
+def test_metrics_are_not_served_without_a_configured_token(client, monkeypatch, token):
+    monkeypatch.setattr(instrumentation, "METRICS_TOKEN", token)
+    assert client.get("/metrics", headers=metrics_headers("anything")).status_code == 404
@@ -0,0 +1,198 @@
+"""Outbox delivery through the local sink transport: claiming, delivery,
+retries with backoff and dead-lettering."""
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from backend.db import SessionLocal, engine
+from backend.email_utils import LocalSinkTransport
+from backend.outbox import OutboxWorker, RateLimiter, enqueue, utcnow
+from backend.schemas import Base, EmailOutbox
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingTransport(LocalSinkTransport):
+    """Fails the first `failures` sends, then delivers."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def send_batch(self, messages):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("provider unavailable")
+        await super().send_batch(messages)
+
+
+def message(n: int) -> dict:
+    return {"from": "test@example.com", "to": [f"user{n}@example.com"], "subject": f"Message {n}", "html": "<p>hi</p>"}
+
+
+def make_worker(transport, **options) -> OutboxWorker:
+    options.setdefault("rate_limits", {})
+    return OutboxWorker(transports={"local": transport}, **options)
+
+
+@pytest.fixture(autouse=True)
+async def outbox():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(delete(EmailOutbox))
+    yield
+    await engine.dispose()
+
+
+async def queue(count: int) -> None:
+    async with SessionLocal() as db:
+        await enqueue(db, [message(n) for n in range(count)], kind="test", provider="local")
+        await db.commit()
+
+
+async def outbox_rows() -> list[EmailOutbox]:
+    async with SessionLocal() as db:
+        return (await db.scalars(select(EmailOutbox).order_by(EmailOutbox.id))).all()
+
+
+async def make_due() -> None:
+    async with SessionLocal() as db:
+        await db.execute(update(EmailOutbox).values(next_attempt_at=utcnow()))
+        await db.commit()
+
+
+async def test_drain_delivers_queued_messages():
+    transport = LocalSinkTransport()
+    await queue(3)
+
+    assert await make_worker(transport).drain() == 3
+
+    assert [sent["subject"] for sent in transport.sent] == ["Message 0", "Message 1", "Message 2"]
+    rows = await outbox_rows()
+    assert {row.status for row in rows} == {"sent"}
+    assert all(row.attempts == 1 and row.sent_at is not None and row.claim_token is None for row in rows)
+
+
+async def test_nothing_is_sent_before_commit():
+    transport = LocalSinkTransport()
+    async with SessionLocal() as db:
+        await enqueue(db, [message(0)], kind="test", provider="local")
+        await db.rollback()
+
+    assert await make_worker(transport).drain() == 0
+    assert transport.sent == []
+
+
+async def test_claimed_rows_are_not_claimed_again_until_the_lease_expires():
+    await queue(2)
+    worker = make_worker(LocalSinkTransport())
+
+    claimed = await worker.claim()
+    assert len(claimed) == 2
+    assert await worker.claim() == []
+
+    async with SessionLocal() as db:
+        await db.execute(update(EmailOutbox).values(claimed_until=utcnow() - timedelta(seconds=1)))
+        await db.commit()
+    assert [row.id for row in await worker.claim()] == [row.id for row in claimed]
+
+
+async def test_batches_respect_the_batch_size():
+    transport = LocalSinkTransport()
+    await queue(5)
+
+    assert await make_worker(transport, batch_size=2).drain() == 5
+    assert len(transport.sent) == 5
+
+
+async def test_failed_delivery_is_retried_with_backoff():
+    transport = FailingTransport(failures=1)
+    worker = make_worker(transport, retry_base_seconds=60)
+    await queue(1)
+
+    before = utcnow()
+    assert await worker.drain() == 0
+    [row] = await outbox_rows()
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert row.last_error == "provider unavailable"
+    # 60s base delay with ±20% jitter; not due again yet.
+    assert before + timedelta(seconds=47) <= row.next_attempt_at <= utcnow() + timedelta(seconds=73)
+    assert await worker.drain() == 0
+
+    await make_due()
+    assert await worker.drain() == 1
+    [row] = await outbox_rows()
+    assert row.status == "sent"
+    assert row.attempts == 2
+    assert len(transport.sent) == 1
+
+
+async def test_backoff_grows_exponentially():
+    worker = make_worker(FailingTransport(failures=2), retry_base_seconds=60)
+    await queue(1)
+
+    await worker.drain()
+    await make_due()
+    started = utcnow()
+    await worker.drain()
+    [row] = await outbox_rows()
+    assert row.attempts == 2
+    assert row.next_attempt_at >= started + timedelta(seconds=120 * 0.8)
+
+
+async def test_messages_are_dead_lettered_after_max_attempts():
+    transport = FailingTransport(failures=10)
+    worker = make_worker(transport, max_attempts=2)
+    await queue(2)
+
+    await worker.drain()
+    await make_due()
+    await worker.drain()
+
+    rows = await outbox_rows()
+    assert {row.status for row in rows} == {"dead"}
+    assert all(row.attempts == 2 for row in rows)
+    await make_due()
+    assert await worker.claim() == []
+    assert transport.sent == []
+
+
+async def test_zero_rate_limit_means_no_limit():
+    worker = make_worker(LocalSinkTransport(), rate_limits={"local": 0})
+    assert worker.limiters == {}
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+
+
+async def test_rate_limiter_spaces_acquisitions():
+    limiter = RateLimiter(50)
+    limiter.tokens = 0
+    started = time.monotonic()
+    await limiter.acquire()
+    await limiter.acquire()
+    assert time.monotonic() - started >= 2 / 50 * 0.9
+
+
+async def test_daily_reminders_are_queued_while_the_query_streams(monkeypatch):
+    from backend import scheduler
+    from backend.schemas import Todo, User
+
+    # Several chunks, so outbox rows are written while the cursor is open.
+    monkeypatch.setattr(scheduler, "REMINDER_CHUNK_SIZE", 2)
+    async with SessionLocal() as db:
+        users = [
+            User(username=f"reminded{n}", hashed_password="-", email=f"reminded{n}@example.com")
+            for n in range(5)
+        ]
+        db.add_all(users)
+        await db.flush()
+        db.add_all(Todo(title="pending", priority="low", user_id=user.id) for user in users)
+        await db.commit()
+
+    await scheduler.send_daily_reminders()
+
+    recipients = {row.recipient for row in await outbox_rows() if row.kind == "reminder"}
+    assert {f"reminded{n}@example.com" for n in range(5)} <= recipients
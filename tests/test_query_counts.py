@@ -0,0 +1,61 @@
+"""SQL statements per request for the note list and search endpoints must
+not grow with the number of notes (no per-note tag loading)."""
+from datetime import date
+
+import pytest
+
+from backend.instrumentation import request_statements
+from backend.principal_cache import principal_cache
+
+ENDPOINTS = [
+    ("/notes/", "/notes/"),
+    ("/notes/?fields=id,title", "/notes/"),
+    ("/notes/?fields=id,tags", "/notes/"),
+    ("/notes/?fields=title,created_at,tags", "/notes/"),
+    ("/notes/?tag=shared", "/notes/"),
+    ("/notes/?tag=shared&tag=tag1&match=any", "/notes/"),
+    ("/notes/search?query=note", "/notes/search"),
+    (f"/notes/date/{date.today().isoformat()}", "/notes/date/{created_date}"),
+    ("/notes/tags", "/notes/tags"),
+    ("/search?q=note&limit=50", "/search"),
+    ("/search?q=note&limit=50&types=note", "/search"),
+]
+
+
+def statement_count(client, headers, url: str, route: str) -> int:
+    """Statements run by one GET of `url`, from the per-request hook in
+    instrumentation (which labels requests by route template)."""
+    before = request_statements.sum(route=route, method="GET")
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return int(request_statements.sum(route=route, method="GET") - before)
+
+
+def add_notes(client, headers, start: int, stop: int) -> None:
+    for i in range(start, stop):
+        response = client.post(
+            "/notes/",
+            json={"title": f"note {i}", "content": "note body", "tags": ["shared", f"tag{i % 7}", f"own{i}"]},
+            headers=headers,
+        )
+        assert response.status_code == 201, response.text
+
+
+@pytest.fixture
+def no_auth_cache(monkeypatch):
+    # Every request loads the user, so a cache hit or miss cannot change the count.
+    monkeypatch.setattr(principal_cache, "ttl", 0)
+    principal_cache.clear()
+
+
+@pytest.mark.parametrize("fast", [False, True], ids=["orm", "fast"])
+def test_statement_counts_do_not_grow_with_notes(client, auth_headers, no_auth_cache, monkeypatch, fast):
+    monkeypatch.setattr("backend.pagination.FAST_SERIALIZATION", fast)
+
+    add_notes(client, auth_headers, 0, 5)
+    few = {url: statement_count(client, auth_headers, url, route) for url, route in ENDPOINTS}
+    add_notes(client, auth_headers, 5, 30)
+    many = {url: statement_count(client, auth_headers, url, route) for url, route in ENDPOINTS}
+
+    assert many == few
+    assert all(count > 0 for count in few.values())
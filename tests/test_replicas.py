@@ -0,0 +1,111 @@
+"""Read replica routing, with a second SQLite file standing in for the replica.
+
+Reads go to the replica, flushes and DML to the primary, and a client that
+sends back the X-Read-Primary token of its last write reads from the primary.
+"""
+import tempfile
+
+import pytest
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend import db as db_module
+from backend.db import READ_PRIMARY_HEADER, async_url, read_sessionmaker
+from backend.schemas import Base, Note
+
+NOTES_QUERY = 'FROM "Note"'
+
+
+@pytest.fixture(scope="module")
+def replica_engine(client):
+    replica = create_async_engine(async_url(f"sqlite:///{tempfile.mkdtemp(prefix='lumina-replica-')}/lumina.db"))
+
+    async def create_tables():
+        async with replica.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    # On the app's event loop, which serves the requests using the engine.
+    client.portal.call(create_tables)
+    yield replica
+    client.portal.call(replica.dispose)
+
+
+@pytest.fixture
+def statements(replica_engine, monkeypatch):
+    """Sends ReadSessionDep reads to `replica_engine`; yields the SQL run on
+    each engine."""
+    monkeypatch.setattr(db_module, "replica_engines", [replica_engine])
+    monkeypatch.setattr(db_module, "ReadSessionLocal", read_sessionmaker([replica_engine]))
+    statements = {"primary": [], "replica": []}
+    listeners = [
+        (db_module.engine.sync_engine, lambda *args: statements["primary"].append(args[2])),
+        (replica_engine.sync_engine, lambda *args: statements["replica"].append(args[2])),
+    ]
+    for target, listener in listeners:
+        event.listen(target, "before_cursor_execute", listener)
+    yield statements
+    for target, listener in listeners:
+        event.remove(target, "before_cursor_execute", listener)
+
+
+def user_id(client, headers) -> int:
+    return client.get("/users/me/", headers=headers).json()["id"]
+
+
+def note_titles(client, headers) -> list[str]:
+    response = client.get("/notes/", headers=headers)
+    assert response.status_code == 200, response.text
+    return [note["title"] for note in response.json()]
+
+
+def test_reads_go_to_the_replica(client, replica_engine, statements, auth_headers):
+    owner = user_id(client, auth_headers)
+
+    async def seed_replica():
+        async with replica_engine.begin() as connection:
+            await connection.execute(insert(Note), {"title": "on the replica", "content": "", "user_id": owner})
+
+    client.portal.call(seed_replica)
+    statements["primary"].clear()
+
+    assert note_titles(client, auth_headers) == ["on the replica"]
+    assert any(NOTES_QUERY in sql for sql in statements["replica"])
+    assert not any(NOTES_QUERY in sql for sql in statements["primary"])
+
+
+def test_flushes_and_dml_go_to_the_primary(client, statements, auth_headers):
+    owner = user_id(client, auth_headers)
+
+    async def write_through_a_read_session():
+        async with db_module.ReadSessionLocal(info={"user_id": owner}) as db:
+            db.add(Note(title="flushed", content="", user_id=owner))
+            await db.flush()
+            await db.execute(update(Note).where(Note.user_id == owner).values(is_pinned=True))
+            await db.rollback()
+            await db.scalars(select(Note).where(Note.user_id == owner))
+
+    client.portal.call(write_through_a_read_session)
+
+    assert any(sql.startswith('INSERT INTO "Note"') for sql in statements["primary"])
+    assert any(sql.startswith('UPDATE "Note"') for sql in statements["primary"])
+    assert not any(sql.startswith(("INSERT", "UPDATE")) for sql in statements["replica"])
+    # Outside of a write, the session still reads from the replica.
+    assert any(NOTES_QUERY in sql for sql in statements["replica"])
+
+
+def test_a_recent_writer_reads_from_the_primary(client, statements, make_user):
+    writer, other = make_user(), make_user()
+    response = client.post("/notes/", json={"title": "just written", "content": ""}, headers=writer)
+    assert response.status_code == 201, response.text
+    token = response.headers[READ_PRIMARY_HEADER]
+
+    # Without the token the write is not on the replica yet.
+    assert note_titles(client, writer) == []
+    assert note_titles(client, {**writer, READ_PRIMARY_HEADER: token}) == ["just written"]
+    # Reads made with the token are not writes, so they do not renew it.
+    assert READ_PRIMARY_HEADER not in client.get("/notes/", headers={**writer, READ_PRIMARY_HEADER: token}).headers
+
+    # The token only counts for the user it was issued to, and must be valid.
+    other_token = client.post("/notes/", json={"title": "theirs", "content": ""}, headers=other).headers[READ_PRIMARY_HEADER]
+    assert note_titles(client, {**writer, READ_PRIMARY_HEADER: other_token}) == []
+    assert note_titles(client, {**writer, READ_PRIMARY_HEADER: token[:-2]}) == []
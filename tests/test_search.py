@@ -0,0 +1,13 @@
+"""Validation of the /search query parameters."""
+
+
+def test_unknown_types_are_rejected(client, auth_headers):
+    response = client.get("/search", params={"q": "note", "types": ["todo", "bogus"]}, headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_known_types_are_accepted(client, auth_headers):
+    client.post("/notes/", json={"title": "findable note", "content": ""}, headers=auth_headers)
+    response = client.get("/search", params={"q": "findable", "types": ["note"]}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [hit["type"] for hit in response.json()] == ["note"]
@@ -0,0 +1,67 @@
+"""Slow-query plans are captured on a separate connection, so statements
+still streaming results are not disturbed."""
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.slow_queries import SlowQueryLog
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def logged_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/slow.db")
+    log = SlowQueryLog(threshold_ms=0, explain=True)
+    log.install(engine)
+    async with engine.begin() as connection:
+        await connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)"))
+        await connection.execute(text("INSERT INTO item (name) VALUES (:name)"), [{"name": f"item {i}"} for i in range(50)])
+    yield engine, log
+    await log.aclose()
+    await engine.dispose()
+
+
+async def wait_for_plans(log: SlowQueryLog) -> None:
+    while log._plan_tasks:
+        await asyncio.sleep(0.01)
+
+
+async def test_plan_is_captured_while_results_stream(logged_engine):
+    engine, log = logged_engine
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            text("SELECT id, name FROM item WHERE id > :id ORDER BY id").execution_options(yield_per=10), {"id": 0}
+        )
+        rows = 0
+        async for partition in result.partitions():
+            rows += len(partition)
+            await asyncio.sleep(0)
+    assert rows == 50
+
+    await wait_for_plans(log)
+    [entry] = [entry for entry in log.report() if entry["statement"].startswith("SELECT id, name FROM item")]
+    assert entry["plan"] and not entry["plan"][0].startswith("EXPLAIN failed")
+    # The EXPLAIN itself is neither timed nor reported.
+    assert not any(entry["statement"].startswith("EXPLAIN") for entry in log.report())
+
+
+async def test_plan_is_captured_once_per_statement(logged_engine):
+    engine, log = logged_engine
+    async with engine.connect() as connection:
+        for i in range(3):
+            await connection.execute(text("SELECT name FROM item WHERE id = :id"), {"id": i})
+    await wait_for_plans(log)
+    [entry] = [entry for entry in log.report() if entry["statement"].startswith("SELECT name FROM item")]
+    assert entry["count"] == 3
+    assert entry["plan"]
+
+
+def test_slow_query_report_requires_the_metrics_token(client):
+    assert client.get("/metrics/slow-queries").status_code == 401
+    response = client.get("/metrics/slow-queries", headers={"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)